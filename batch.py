@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"Estimate future paychecks for many configs in parallel."
+
+from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
+from os import cpu_count
+from signal import signal, SIGPIPE, SIG_DFL
+from sys import exit as sys_exit
+
+from lib.batch import batch, expand
+from lib.config import parse_today
+from lib.log import warn
+from lib.output import FORMATS
+
+
+def main():
+    "The main routine."
+    parser = ArgumentParser(
+        description="A batch paystub calculator",
+        formatter_class=ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        default=0,
+        action="count",
+        help="verbosity level, repeat to increase",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        default=cpu_count(),
+        type=int,
+        help="number of worker processes",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        default="output",
+        help="directory for the per-config reports",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        default="csv",
+        choices=FORMATS,
+        help="report format",
+    )
+    parser.add_argument(
+        "--no-cache",
+        default=False,
+        action="store_true",
+        help="always estimate, don't use or update the result cache",
+    )
+    parser.add_argument(
+        "--today",
+        default=None,
+        help="estimate as if today is YYYY-MM-DD",
+    )
+    parser.add_argument(
+        "config_dirs",
+        metavar="CONFIG_DIR",
+        nargs="+",
+        help="directories (or glob patterns) containing config.py",
+    )
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error(f"invalid jobs {args.jobs}")
+
+    failed = 0
+    paths = expand(args.config_dirs)
+    today = None if args.today is None else parse_today(args.today)
+    results = batch(
+        paths,
+        args.output_dir,
+        args.jobs,
+        args.verbose,
+        args.format,
+        not args.no_cache,
+        today,
+    )
+    for path, output, ok, message, seconds in results:
+        if ok:
+            print(f"ok    {path} -> {output} ({seconds:.2f}s)")
+        else:
+            failed += 1
+            print(f"FAIL  {path}: {message} ({seconds:.2f}s)")
+    print(f"{len(paths) - failed} succeeded, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    signal(SIGPIPE, SIG_DFL)  # Suppress broken pipe exceptions.
+    try:
+        sys_exit(main())
+    except KeyboardInterrupt:
+        warn("received keyboard interrupt (CTRL-C), aborting")
+        sys_exit(1)
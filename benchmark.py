@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"Benchmark the 401(k) schedule search against the enumerator."
+
+from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
+from math import isclose
+from signal import signal, SIGPIPE, SIG_DFL
+from sys import exit as sys_exit
+from time import perf_counter
+
+from lib.config import config_path, load, parse_today
+from lib.log import warn
+
+# The benchmark times the optimizer internals directly.
+# pylint: disable=protected-access
+
+
+def _timed(func, repeat):
+    "Returns (result, best seconds) for repeat calls of func"
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        result = func()
+        seconds = perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return result, best
+
+
+def _first(start_list):
+    "Returns the set of first interval percents from a start_list"
+    first = set()
+    for start_iter in start_list:
+        first.update(start_iter)
+    return first
+
+
+def _search_three(savings, start_list, increase, cap):
+    """
+    Returns the best amount Search finds over the same start, increase and
+    tweak intervals the enumerator sweeps, one search per tweak split.
+    """
+    # pylint: disable=import-outside-toplevel
+    from search import Search
+
+    first = _first(start_list)
+    total, best = savings.paychecks_total, None
+    prefix, count_start = savings.prefix, savings.paychecks_start
+    for count_tweak in range(savings.paychecks_tweak):
+        split = total - count_tweak
+        gross = [prefix[count_start], prefix[split] - prefix[count_start]]
+        fixed = {1: increase} if increase else {}
+        if count_tweak:
+            gross.append(prefix[total] - prefix[split])
+        _, amount = Search(gross, savings.change, cap, fixed).closest(first)
+        if amount is not None and (best is None or amount < best):
+            best = amount
+    return best
+
+
+def _enumerate_three(savings, start_list, increase, cap):
+    "Returns the best amount found by the start/increase/tweak enumerator"
+    candidates = list(savings._candidates(start_list, increase))
+    amounts = [savings._amount(candidate) for candidate in candidates]
+    best = savings._closest(candidates, savings._near(amounts, cap), cap)
+    return None if best is None else savings._amount_exact(best)
+
+
+def main():
+    "The main routine."
+    # pylint: disable=import-outside-toplevel,too-many-locals
+    parser = ArgumentParser(
+        description="A 401(k) optimizer benchmark",
+        formatter_class=ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-r", "--repeat", default=5, type=int, help="timing repetitions"
+    )
+    parser.add_argument(
+        "-c",
+        "--change",
+        default=2,
+        type=int,
+        help="maximum percent change per boundary",
+    )
+    parser.add_argument(
+        "--today",
+        default=None,
+        help="benchmark as if today is YYYY-MM-DD",
+    )
+    parser.add_argument(
+        "config_dir",
+        metavar="CONFIG_DIR",
+        nargs=1,
+        help="directory containing config.py",
+    )
+    args = parser.parse_args()
+    args.config = config_path(args.config_dir[0])
+    if not args.config.is_file():
+        parser.error(f"can't find config '{args.config}'")
+
+    from salary import Salary
+    from savings import Savings
+    from search import Search
+
+    today = None if args.today is None else parse_today(args.today)
+    cfg = load(args.config)(args.config, today=today)
+    savings = Savings(
+        cfg,
+        sorted(Salary(cfg)),
+        change=args.change,
+        backend="python",
+        optimize=False,
+    )
+    _, start_list, increase, cap = savings._setup("pre")
+
+    print("K=3 start/increase/tweak, pre-tax")
+    enum, enum_time = _timed(
+        lambda: _enumerate_three(savings, start_list, increase, cap),
+        args.repeat,
+    )
+    search, search_time = _timed(
+        lambda: _search_three(savings, start_list, increase, cap),
+        args.repeat,
+    )
+    same = enum is not None and search is not None and isclose(enum, search)
+    print(f"  enumerator  {enum_time * 1000.0:10.3f} ms  amount {enum}")
+    print(f"  search      {search_time * 1000.0:10.3f} ms  amount {search}")
+    print(f"  same amount {same}")
+
+    first = _first(start_list)
+    print("Search scaling with K evenly spaced change points, pre-tax")
+    count = len(savings.salary)
+    for points in (3, 4, 6, 8, 12, 24):
+        bounds = sorted({count * k // points for k in range(points + 1)})
+        gross = [
+            savings.prefix[hi] - savings.prefix[lo]
+            for lo, hi in zip(bounds, bounds[1:])
+        ]
+        engine = Search(gross, args.change, cap)
+        (_, amount), seconds = _timed(lambda e=engine: e.closest(first), 1)
+        print(
+            f"  K={points:<3} {seconds * 1000.0:10.3f} ms"
+            f"  states {engine.states:>8}  amount {amount}"
+        )
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    signal(SIGPIPE, SIG_DFL)  # Suppress broken pipe exceptions.
+    try:
+        sys_exit(main())
+    except KeyboardInterrupt:
+        warn("received keyboard interrupt (CTRL-C), aborting")
+        sys_exit(1)
@@ -15,6 +15,11 @@ class Config(BaseConfig):
         self.income.rsu = [  # month, day, quantity, price, fed_tax%
             self.rsu(2, 15, 10),
         ]
+        # Many vests load from a CSV or JSON file next to this one (JSON
+        # Lines or one array of objects), columns named like the arguments
+        # above, see lib/schedule.py:
+        #   self.income.rsu = self.rsu_schedule("vests.csv")
+        #   self.income.supplimental = self.supplimental_schedule("bonus.csv")
 
         # Any other NON-RSU supplimental income
         self.income.supplimental = [  # month, day, gross, kind, fed_tax%
@@ -2,14 +2,23 @@
 "Estimate future paychecks."
 
 from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
+from contextlib import nullcontext
 from pathlib import Path
 from signal import signal, SIGPIPE, SIG_DFL
 from sys import exit as sys_exit
-from sys import path as sys_path
+from sys import stderr
 
+from lib.cache import ResultCache
+from lib.config import config_path, load, parse_today
+from lib.engine import ENGINES
 from lib.log import warn
+from lib.output import FORMATS, write
 from lib.pay import Pay
 
+# lib modules import profiler from lib itself, profile with that module's
+# state rather than a second copy imported as lib.profiler.
+from profiler import Profile, timed  # pylint: disable=wrong-import-order
+
 
 def main():
     "The main routine."
@@ -31,6 +40,61 @@ def main():
         action="store_true",
         help="show paycheck periods instead of the full CSV",
     )
+    parser.add_argument(
+        "-C",
+        "--columns",
+        default=None,
+        help="comma separated Income fields to report, e.g. net,tax_federal",
+    )
+    parser.add_argument(
+        "-c",
+        "--columnar",
+        default=False,
+        action="store_true",
+        help="keep incomes in a columnar ledger",
+    )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        default="staged",
+        choices=ENGINES,
+        help="tax and YTD engine, fused computes them in one pass",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        default="csv",
+        choices=FORMATS,
+        help="output format",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="-",
+        help="output file, - for stdout",
+    )
+    parser.add_argument(
+        "--no-cache",
+        default=False,
+        action="store_true",
+        help="always estimate, don't use or update the result cache",
+    )
+    parser.add_argument(
+        "--today",
+        default=None,
+        help="estimate as if today is YYYY-MM-DD",
+    )
+    parser.add_argument(
+        "--profile",
+        default=False,
+        action="store_true",
+        help="print stage times, memory peaks and event counts to stderr",
+    )
+    parser.add_argument(
+        "--profile-json",
+        default=None,
+        help="write the --profile report as JSON to this file",
+    )
     parser.add_argument(
         "config_dir",
         metavar="CONFIG_DIR",
@@ -38,25 +102,35 @@ def main():
         help="directory containing config.py",
     )
     args = parser.parse_args()
-    config_dir = args.config_dir[0]
-    if config_dir.endswith("/config.py"):
-        config_dir = config_dir.removesuffix("/config.py")
-    args.config = Path(config_dir).resolve() / "config.py"
+    args.config = config_path(args.config_dir[0])
     if not args.config.is_file():
         parser.error(f"can't find config '{args.config}'")
 
-    # Place path for Config first. This allows black/pylint to import the
-    # base Config class under lib during validation testing.
-    sys_path.insert(0, str(args.config.parent))
-    from config import Config  # pylint: disable=import-outside-toplevel
-
-    pay = Pay(Config(args.config), args.verbose)
+    columns = None
     if args.pay_periods:
-        print("\n".join(pay.pay_periods()))
-    else:
-        print("\n".join(pay.csv()))
-        print("")
-        print("\n".join(pay.csv_info()))
+        columns = ()  # Only salary dates
+    elif args.columns is not None:
+        names = (col.strip() for col in args.columns.split(","))
+        columns = [col for col in names if col]
+    today = None if args.today is None else parse_today(args.today)
+    cache = None if args.no_cache or args.pay_periods else ResultCache()
+    profile = nullcontext()
+    if args.profile or args.profile_json:
+        profile = Profile()
+    with profile:
+        with timed("config"):
+            cfg = load(args.config)(args.config, today=today)
+        pay = Pay(
+            cfg, args.verbose, args.columnar, args.engine, columns, cache
+        )
+        if args.pay_periods:
+            print("\n".join(pay.pay_periods()))
+        else:
+            write(pay, args.output, args.format)
+    if args.profile:
+        print("\n".join(profile.table()), file=stderr)
+    if args.profile_json:
+        Path(args.profile_json).write_text(f"{profile.json()}\n", "utf-8")
 
 
 if __name__ == "__main__":
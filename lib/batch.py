@@ -0,0 +1,134 @@
+"Batch estimates for many config directories"
+
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob, has_magic
+from pathlib import Path
+from time import perf_counter
+
+# pylint takes config for the repo's config/ directory, not lib/config.py.
+# pylint: disable=wrong-import-order
+from cache import ResultCache
+from config import config_path, load
+from log import ErrorExit, verbose_level
+from output import suffix, write
+from pay import Pay
+from stock import prices
+
+# pylint: enable=wrong-import-order
+
+
+def expand(config_dirs):
+    """
+    Returns a list of config.py Paths from config_dirs, expanding any glob
+    patterns into directories. Patterns that match nothing are kept so
+    they're reported as failures instead of silently dropped.
+    """
+    paths = []
+    for config_dir in config_dirs:
+        matches = []
+        if has_magic(config_dir):
+            for match in sorted(glob(config_dir)):
+                if Path(match).is_dir() or match.endswith("/config.py"):
+                    matches.append(match)
+        for match in matches or [config_dir]:
+            path = config_path(match)
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def output_names(paths):
+    """
+    Returns a list of output file stems, one per config path. The config
+    directory name is used and duplicates get a numeric suffix.
+    """
+    names, seen = [], {}
+    for path in paths:
+        name = path.parent.name or "config"
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            name = f"{name}-{seen[name]}"
+        names.append(name)
+    return names
+
+
+def prefetch(paths, today=None):
+    """
+    Fetches the stock quotes of every config in paths together, see
+    stock.prices(), so each run() finds its quote cached instead of
+    fetching them one at a time. Configs are loaded without quotes to find
+    their urls. The ones that fail to load are left for run() to report.
+    """
+    urls = []
+    for path in paths:
+        try:
+            cfg = load(path)(path, today=today, quotes=False)
+        # pylint: disable-next=broad-exception-caught
+        except (ErrorExit, Exception):
+            continue
+        if cfg.rsu_url:
+            urls.append(cfg.rsu_url)
+    if urls:
+        prices(urls)
+
+
+def run(path, output, log_level=0, fmt="csv", cache=True, today=None):
+    """
+    Estimates a single config and writes the report to output in format
+    fmt. Returns a (path, output, ok, message, seconds) tuple and never
+    exits: errors from a bad config are reported back to the caller.
+    Finished estimates come from and go to the ResultCache when cache is
+    True, today is a fixed datetime for Config.today().
+    """
+    start = perf_counter()
+    try:
+        cache = ResultCache() if cache else None
+        cfg = load(path)(path, today=today)
+        pay = Pay(cfg, log_level, cache=cache)
+        write(pay, output, fmt)
+        ok, message = True, ""
+    except ErrorExit as exc:
+        ok, message = False, exc.msg
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        ok, message = False, f"{type(exc).__name__}: {exc}"
+    return str(path), str(output), ok, message, perf_counter() - start
+
+
+def batch(
+    paths,
+    output_dir,
+    jobs=None,
+    log_level=0,
+    fmt="csv",
+    cache=True,
+    today=None,
+):
+    """
+    Estimates every config in paths across a pool of jobs processes and
+    writes one report per config into output_dir in format fmt. Yields
+    run() results in the same order as paths.
+    """
+    verbose_level(log_level)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    outputs = [
+        output_dir / f"{name}{suffix(fmt)}" for name in output_names(paths)
+    ]
+    if len(paths) > 1:
+        prefetch(paths, today)
+    if jobs == 1 or len(paths) < 2:
+        for path, output in zip(paths, outputs):
+            yield run(path, output, log_level, fmt, cache, today)
+        return
+    count = len(paths)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(
+            run,
+            paths,
+            outputs,
+            [log_level] * count,
+            [fmt] * count,
+            [cache] * count,
+            [today] * count,
+            chunksize=1,
+        )
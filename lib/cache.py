@@ -0,0 +1,169 @@
+"On-disk cache of finished estimates"
+
+from datetime import datetime
+from hashlib import sha256
+from json import dumps as json_dumps
+from os import environ, getuid, replace, utime
+from pathlib import Path
+from pickle import HIGHEST_PROTOCOL, UnpicklingError, dumps, loads
+from tempfile import NamedTemporaryFile
+
+from holder import Holder
+from income import Income
+from ledger import Ledger
+from profiler import count
+from stock import Stock
+
+_BASE = Path(__file__).parent.resolve()
+
+# Total bytes of cached estimates kept, least recently used go first.
+LIMIT = 64 << 20
+
+
+def cache_home():
+    "Returns the per-user result cache directory under $XDG_CACHE_HOME"
+    base = environ.get("XDG_CACHE_HOME", "")
+    if not Path(base).is_absolute():
+        base = Path.home() / ".cache"
+    return Path(base) / "paycheck-estimator" / "results"
+
+
+def source_version():
+    "Returns a hash of every lib source file, the code version of a result"
+    digest = sha256()
+    for path in sorted(_BASE.glob("*.py")):
+        digest.update(path.name.encode("utf-8"))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _canonical(value):
+    "Returns value as JSON data, for hashing resolved config values"
+    # pylint: disable=too-many-return-statements
+    if isinstance(value, Holder):
+        return {attr: _canonical(getattr(value, attr)) for attr in value}
+    if isinstance(value, Income):
+        return value.csv_values()
+    if isinstance(value, (list, tuple, set)):
+        values = [_canonical(item) for item in value]
+        return sorted(values, key=repr) if isinstance(value, set) else values
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return repr(value)
+
+
+class ResultCache:
+    """
+    Finished estimates (the list of incomes) stored one file per key in
+    directory, cache_home() by default. Entries are pickles, so directory
+    is created private (mode 0700) and one that another user owns or can
+    write to is never read. A key hashes everything an estimate depends on: the
+    resolved config values and config.py source, the lib source, the
+    engine, cfg.today() and the cached stock price. Use Config(today=...)
+    to pin today so keys stay the same from one day to the next.
+
+    Keys are None when a result can't be reused: with warm_start the
+    previous run's savings state is an input too.
+    """
+
+    def __init__(self, directory=None, limit=LIMIT):
+        if directory is None:
+            directory = cache_home()
+        self.directory = Path(directory)
+        self.limit = limit
+        self._source = None
+        self._private = None
+
+    def private(self):
+        """
+        Returns True once directory exists, belongs to this user and only
+        this user can write to it. Creates it with mode 0700 if missing.
+        """
+        if self._private is None:
+            try:
+                self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+                stat = self.directory.stat()
+            except OSError:
+                return False
+            self._private = stat.st_uid == getuid() and not (
+                stat.st_mode & 0o022
+            )
+            if not self._private:
+                count("result cache not private")
+        return self._private
+
+    def key(self, cfg, engine="staged"):
+        "Returns the key for cfg's estimate or None if it can't be cached"
+        if cfg.save.warm_start:
+            return None
+        if self._source is None:
+            self._source = source_version()
+        price = Stock(cfg.rsu_url).cached() if cfg.rsu_url else None
+        values = {
+            attr: _canonical(value)
+            for attr, value in vars(cfg).items()
+            if not attr.startswith("_")
+        }
+        data = {
+            "source": self._source,
+            "config": cfg.filename.read_text("utf-8"),
+            "values": values,
+            "engine": engine,
+            "today": cfg.today().date().isoformat(),
+            "price": price,
+        }
+        raw = json_dumps(data, sort_keys=True, default=repr)
+        return sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.directory / f"{key}.pickle"
+
+    def get(self, key):
+        "Returns the cached list of incomes for key or None on a miss"
+        if not self.private():
+            return None
+        path = self._path(key)
+        try:
+            income_list = loads(path.read_bytes())
+            utime(path)  # Most recently used
+        except (OSError, EOFError, UnpicklingError):
+            count("result cache miss")
+            return None
+        count("result cache hit")
+        return income_list
+
+    def put(self, key, income_list):
+        """
+        Stores a finished list of incomes (or Ledger) under key then evicts
+        the least recently used entries over the size limit
+        """
+        if not self.private():
+            return
+        if isinstance(income_list, Ledger):
+            income_list = income_list.income()
+        with NamedTemporaryFile(
+            dir=self.directory, suffix=".tmp", delete=False
+        ) as file:
+            file.write(dumps(list(income_list), protocol=HIGHEST_PROTOCOL))
+        replace(file.name, self._path(key))  # Readers never see a partial
+        self.evict()
+
+    def evict(self):
+        "Removes least recently used entries until under the size limit"
+        entries = []
+        for path in self.directory.glob("*.pickle"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue  # Evicted by another process
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.limit:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
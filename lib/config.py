@@ -1,27 +1,46 @@
 "Base User Config"
 
+from calendar import isleap
 from datetime import datetime, timezone
+from importlib.util import module_from_spec, spec_from_file_location
+from itertools import count
 from pathlib import Path
 
+from dateindex import DateIndex
 from git import repo_version
 from holder import Holder
+from holidays import holidays, paydays
 from income import Income
 from log import error
+from schedule import read
 from stock import Stock
 
+_MODULE_IDS = count()
+
 
 class Config:
     "User configuration"
 
-    def __init__(self, filename=None):
-        # pylint: disable=too-many-statements
+    def __init__(
+        self,
+        filename=None,
+        overrides=None,
+        today=None,
+        year_offset=0,
+        quotes=True,
+    ):
+        # pylint: disable=too-many-statements,too-many-arguments
         if filename is None:
             filename = __file__
+        self._quotes = quotes  # False prices RSU vests at 0.0, see batch.py
+        self._year_offset = year_offset  # Added to self.year by day()
         self.filename = Path(filename).resolve()
+        self._today = today  # Fixed datetime for today(), None for now
+        self._withhold_index = None, None  # (pay.withhold, its DateIndex)
         self.version = None
         self.country = "us"
-        self._holidays = set()
-        self.year = datetime.now(timezone.utc).year
+        self._rsu_default = []  # RSU incomes priced with self.rsu_price
+        self.year = self.today().year
         self.pay = Holder("Regular per-paycheck income")
         self.pay.term_life = 0.0
         self.pay.hsa = 0.0
@@ -56,6 +75,10 @@ class Config:
         self.income = Holder("Non-salaried income")
         self.income.rsu = []
         self.income.supplimental = []
+        # RSU quantity granted but vesting after this year. When set a
+        # multi-year projection stops repeating this year's vests once it's
+        # used up, see project.py. None repeats them every year.
+        self.income.rsu_unvested = None
 
         # 401(k) contribution optimizer. See docstring for Savings() in
         # savings.py for details and variable meanings and strategy. Set
@@ -77,6 +100,19 @@ class Config:
         # gives the employee some time before deciding to alter the contrib
         # rates after receiving the changed paycheck(s). Default is 0.
         self.save.increase_shift = 0
+        # Extra change dates (datetime from self.day()) each starting a new
+        # contribution interval after increase, e.g. quarterly re-tweaks.
+        # When set the tweak interval is replaced by these and the schedule
+        # is found with a branch and bound search, see search.py.
+        self.save.change_dates = []
+        # Search pre and post-tax schedules together: None keeps the pre-tax
+        # first optimizer, "changes" or "variance" selects the objective, see
+        # joint.py. The joint search is split across workers processes.
+        self.save.joint = None
+        self.save.workers = 1
+        # Save the chosen schedules to savings-state.json next to config.py
+        # and re-tweak them on the next run instead of starting over.
+        self.save.warm_start = False
 
         # Mandatory tax information which the child must provide. Set all to
         # invalid values for early detection of a bad config. The employee
@@ -95,8 +131,35 @@ class Config:
 
         # Call the child's config method and validate internal state.
         self.config()
+        # A projection year_offset years ahead shifts the year the child
+        # set, day() already shifted the dates config() made.
+        self.year += self._year_offset
+        self._year_offset = 0
+        self.override(overrides or {})
         self._validate()
 
+    def override(self, overrides):
+        """
+        Sets each dotted attribute path in overrides to its value after the
+        child's config(), e.g. {"pay.increase.percent": 3.0}. Setting
+        rsu_price re-prices every RSU vest that used the default price.
+        year can't be set, config() already made its dates in the old year.
+        """
+        for path, value in overrides.items():
+            if path == "year":
+                error("config path 'year' can't be overridden")
+            *parents, attr = path.split(".")
+            obj = self
+            for parent in parents:
+                obj = getattr(obj, parent, None)
+            if obj is None or attr.startswith("_") or not hasattr(obj, attr):
+                error(f"unknown config path '{path}'")
+            setattr(obj, attr, value)
+            if path == "rsu_price":
+                for income in self._rsu_default:
+                    income.rsu_vest_price = float(value)
+                    income.gross = income.rsu_quantity * float(value)
+
     def _validate(self):
         # pylint: disable=too-many-branches
         # Set the pay increase start_date now because it's depenenent on what
@@ -153,10 +216,15 @@ class Config:
         Returns the float amount to withhold on a salaried paycheck based on
         datetime object date.
         """
-        for start_date, amount in self.pay.withhold:
-            if date >= start_date:
-                return float(amount)
-        return 0.0
+        withhold, index = self._withhold_index
+        if withhold is not self.pay.withhold or len(index) != len(withhold):
+            # Rebuilt after withhold() or an override replaces the list.
+            # Sorted ascending the last entry of a day is the largest amount,
+            # the first one found in the reverse sorted list.
+            index = DateIndex.schedule(sorted(self.pay.withhold))
+            self._withhold_index = self.pay.withhold, index
+        entry = index.on_or_before(date)
+        return 0.0 if entry is None else float(entry[1])
 
     def supplimental(self, month, day, gross, kind, percent_tax_federal=0.0):
         "Returns a supplimental Income object"
@@ -171,20 +239,33 @@ class Config:
 
     def rsu(self, month, day, quantity, price=None, percent_tax_federal=0.0):
         "Returns an RSU Income object"
-        quantity = float(quantity)
-        if price is None:
-            price = self.rsu_price
-            if price is None:
-                if not self.rsu_url:
-                    error("missing stock url")
-                price = Stock(self.rsu_url).price()
-        price = float(price)
+        default = price is None
+        if default:
+            price = self._rsu_price()
+        return self._rsu(
+            month, day, quantity, price, default, percent_tax_federal
+        )
+
+    def _rsu_price(self):
+        "Returns the price of RSU vests without one"
+        if self.rsu_price is not None:
+            return self.rsu_price
+        if not self.rsu_url:
+            error("missing stock url")
+        if not self._quotes:
+            return 0.0
+        return Stock(self.rsu_url).price()
+
+    def _rsu(self, month, day, quantity, price, default, percent_tax_federal):
+        quantity, price = float(quantity), float(price)
         # Prior vests have shown it takes about a week between the vest date
         # and receiving a paystub. Add 7 to day to reflect that.
         date = self.day(month, day + 7)
         new = Income(date=date, gross=quantity * price, kind="rsu")
         new.rsu_quantity = quantity
         new.rsu_vest_price = price
+        if default:
+            self._rsu_default.append(new)
         percent_tax_federal = float(percent_tax_federal)
         if percent_tax_federal > 0.0:
             new.percent_tax_federal = percent_tax_federal
@@ -192,60 +273,76 @@ class Config:
             error(f"negative federal tax percent {percent_tax_federal}")
         return new
 
+    def rsu_schedule(self, filename):
+        """
+        Returns a list of RSU Income objects, one per vest in a CSV or JSON
+        schedule file with rsu() columns, see schedule.py. Vests without a
+        price share a single default price lookup.
+        """
+        price, result = None, []
+        for where, row in read(self._schedule_path(filename), "rsu"):
+            default = "price" not in row
+            if default and price is None:
+                price = self._rsu_price()
+            try:
+                result.append(
+                    self._rsu(
+                        row["month"],
+                        row["day"],
+                        row["quantity"],
+                        price if default else row["price"],
+                        default,
+                        row.get("percent_tax_federal", 0.0),
+                    )
+                )
+            except ValueError as exc:
+                error(f"{where}: {exc}")
+        return result
+
+    def supplimental_schedule(self, filename):
+        """
+        Returns a list of supplimental Income objects, one per entry in a
+        CSV or JSON schedule file with supplimental() columns, see
+        schedule.py.
+        """
+        result = []
+        for where, row in read(self._schedule_path(filename), "supplimental"):
+            try:
+                result.append(self.supplimental(**row))
+            except ValueError as exc:
+                error(f"{where}: {exc}")
+        return result
+
+    def _schedule_path(self, filename):
+        "Returns filename, relative paths are from the config's directory"
+        return self.filename.parent / filename
+
     def day(self, month, day, year=None):
-        "Returns a datetime day object"
+        """
+        Returns a datetime day object. A projection moves February 29 to
+        the 28th in years that aren't leap years.
+        """
         if year is None:
-            year = self.year
+            year = self.year + self._year_offset
+            if self._year_offset and (month, day) == (2, 29):
+                day = 29 if isleap(year) else 28
         return datetime(year, month, day, tzinfo=timezone.utc)
 
     def today(self):
         "Returns a datetime object for midnight UTC today"
-        now = datetime.now(timezone.utc)
+        now = self._today or datetime.now(timezone.utc)
         return datetime(now.year, now.month, now.day, tzinfo=timezone.utc)
 
     def bank_holiday(self, day):
         "Returns true if datetime day is a bank holiday"
-        if self.country != "us":
-            error("only supports US bank holidays")
-        # https://www.chicagofed.org/utilities/about-us/bank-holidays
-        if not self._holidays:
-            # Add bank holidays that always land on the same day
-            self._holidays.add(self.day(1, 1))  # New Year's
-            self._holidays.add(self.day(6, 19))  # Juneteenth
-            self._holidays.add(self.day(7, 4))  # Independence
-            self._holidays.add(self.day(11, 11))  # Veterans
-            self._holidays.add(self.day(12, 25))  # Christmas
-            if self.year == 2024:
-                self._holidays.add(self.day(1, 15))  # MLK
-                self._holidays.add(self.day(2, 19))  # Presidents
-                self._holidays.add(self.day(5, 27))  # Memorial
-                self._holidays.add(self.day(9, 2))  # Labor
-                self._holidays.add(self.day(10, 14))  # Colombus
-                self._holidays.add(self.day(11, 28))  # Thanksgiving
-            elif self.year == 2025:
-                self._holidays.add(self.day(1, 20))  # MLK
-                self._holidays.add(self.day(2, 17))  # Presidents
-                self._holidays.add(self.day(5, 26))  # Memorial
-                self._holidays.add(self.day(9, 1))  # Labor
-                self._holidays.add(self.day(10, 13))  # Colombus
-                self._holidays.add(self.day(11, 27))  # Thanksgiving
-            elif self.year == 2026:
-                self._holidays.add(self.day(1, 19))  # MLK
-                self._holidays.add(self.day(2, 16))  # Presidents
-                self._holidays.add(self.day(5, 25))  # Memorial
-                self._holidays.add(self.day(9, 7))  # Labor
-                self._holidays.add(self.day(10, 12))  # Colombus
-                self._holidays.add(self.day(11, 26))  # Thanksgiving
-            elif self.year == 2027:
-                self._holidays.add(self.day(1, 18))  # MLK
-                self._holidays.add(self.day(2, 15))  # Presidents
-                self._holidays.add(self.day(5, 31))  # Memorial
-                self._holidays.add(self.day(9, 6))  # Labor
-                self._holidays.add(self.day(10, 11))  # Colombus
-                self._holidays.add(self.day(11, 25))  # Thanksgiving
-            else:
-                error(f"no bank holiday support for {self.year}")
-        return day in self._holidays
+        return day.date() in holidays(day.year, self.country)
+
+    def paydays(self):
+        "Returns the datetime salary paydays of self.year, see paydays()"
+        return [
+            self.day(month, day)
+            for month, day in paydays(self.year, self.country)
+        ]
 
     def __str__(self):
         pad = 0
@@ -261,3 +358,35 @@ class Config:
                 value = value.pretty(pad)
             s += f"{attr.rjust(pad)} {value}\n"
         return s[:-1]
+
+
+def config_path(config_dir):
+    "Returns the resolved config.py Path for a CONFIG_DIR argument"
+    config_dir = str(config_dir).removesuffix("/config.py")
+    return Path(config_dir).resolve() / "config.py"
+
+
+def parse_today(value):
+    "Returns the UTC datetime for a YYYY-MM-DD today argument"
+    try:
+        date = datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        error(f"invalid today '{value}', use YYYY-MM-DD")
+    return date.replace(tzinfo=timezone.utc)
+
+
+def load(filename):
+    """
+    Returns the user Config class from filename. Each file is imported under
+    a unique module name so many configs can be loaded in one process.
+    """
+    filename = Path(filename).resolve()
+    if not filename.is_file():
+        error(f"can't find config '{filename}'")
+    name = f"_user_config_{next(_MODULE_IDS)}"
+    spec = spec_from_file_location(name, filename)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not isinstance(getattr(module, "Config", None), type):
+        error(f"no Config class in '{filename}'")
+    return module.Config
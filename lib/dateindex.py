@@ -0,0 +1,64 @@
+"Sorted date index for range queries over incomes and config schedules"
+
+from bisect import bisect_left, bisect_right
+
+from log import error
+
+
+class DateIndex:
+    """
+    Bisect index over a sequence of items in date order: a list of Income
+    objects, a Ledger or (date, value) schedule pairs. Range queries find
+    the contiguous slice of items between two dates in O(log n) instead of
+    scanning every item.
+
+    Ranges follow the pay period convention used throughout: start is
+    exclusive and end inclusive, start < date <= end.
+    """
+
+    def __init__(self, items, dates=None):
+        self.items = items
+        if dates is None:
+            dates = [item.date for item in items]
+        self.dates = list(dates)
+        if len(self.dates) != len(items):
+            error(f"date index has {len(self.dates)} dates for {len(items)}")
+        if any(a > b for a, b in zip(self.dates, self.dates[1:])):
+            error("date index items are not in date order")
+
+    @classmethod
+    def schedule(cls, pairs):
+        "Returns the index of (date, value) pairs in any order"
+        pairs = sorted(pairs, key=lambda pair: pair[0])
+        return cls(pairs, [date for date, _ in pairs])
+
+    def __len__(self):
+        return len(self.dates)
+
+    def span(self, start=None, end=None):
+        """
+        Returns the range of item indexes with start < date <= end, a None
+        start or end leaves that side open
+        """
+        low, high = 0, len(self.dates)
+        if start is not None:
+            low = bisect_right(self.dates, start)
+        if end is not None:
+            high = bisect_right(self.dates, end)
+        return range(low, max(low, high))
+
+    def between(self, start=None, end=None):
+        "Returns the items with start < date <= end, see .span()"
+        indexes = self.span(start, end)
+        if isinstance(self.items, list):
+            return self.items[indexes.start : indexes.stop]
+        return [self.items[index] for index in indexes]
+
+    def before(self, date):
+        "Returns the number of items dated strictly before date"
+        return bisect_left(self.dates, date)
+
+    def on_or_before(self, date):
+        "Returns the last item dated on or before date or None"
+        index = bisect_right(self.dates, date)
+        return self.items[index - 1] if index else None
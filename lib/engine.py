@@ -0,0 +1,134 @@
+"Fused single pass tax and YTD engine"
+
+from federal import Federal
+from medicare import Medicare
+from social_security import SocialSecurity
+
+ENGINES = ("staged", "fused")
+
+# Deductions that also keep a YTD total, in the staged pipeline's order.
+_YTD_DEDUCTIONS = (
+    "term_life",
+    "fsa",
+    "hsa",
+    "medical",
+    "dental",
+    "vision",
+    "vacation_buy",
+)
+
+
+class Engine:
+    """
+    Finishes every income in one ordered pass once 401(k) contributions are
+    set: YTD gross, 401(k) YTDs, deductions, federal, Medicare and Social
+    Security tax and net pay. The staged pipeline in pay.py walks the income
+    list once per step and computes the FICA taxable wage twice, here each
+    income is done before moving to the next and the wage is shared.
+
+    Every value is computed with the same operations in the same order as
+    the staged pipeline, so the results are identical.
+    """
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.federal = Federal(cfg)
+        self.medicare = Medicare(cfg)
+        self.social = SocialSecurity(cfg)
+        self.fudge = cfg.pay.start_net_fudge
+        self.ytd = {}
+
+    def run(self, income_list):
+        "Finishes every income in income_list, in pay order"
+        self.ytd = dict.fromkeys(
+            (
+                "gross",
+                "gross_supplimental",
+                "withhold",
+                "rsu_quantity_vested",
+                "401k",
+                "401k_match",
+                "401k_post",
+                "net",
+                "net_supplimental",
+            ),
+            0.0,
+        )
+        self.ytd.update((f"ytd_{attr}", 0.0) for attr in _YTD_DEDUCTIONS)
+        remaining = 0.0
+        for income in income_list:
+            if income.kind == "rsu":
+                remaining += income.rsu_quantity
+        self.ytd["rsu_quantity_remaining"] = remaining
+        term_life = self.cfg.pay.term_life
+        for income in income_list:
+            self._gross(income)
+            if income.kind == "salary":
+                self._savings(income)
+            self._deductions(income)
+            self.federal.add(income)
+            amount = income.fica_wage(term_life)
+            self.medicare.add(income, amount)
+            self.social.add(income, amount)
+            self._net(income)
+
+    def _gross(self, income):
+        "Sets the gross, withhold and RSU YTD values, see Pay._ytd_gross()"
+        ytd = self.ytd
+        if income.kind == "salary":
+            ytd["gross"] += income.gross
+            ytd["withhold"] += income.withhold
+        else:
+            if income.kind == "rsu":
+                ytd["rsu_quantity_remaining"] -= income.rsu_quantity
+                ytd["rsu_quantity_vested"] += income.rsu_quantity
+            ytd["gross_supplimental"] += income.gross
+        income.ytd_gross = ytd["gross"]
+        income.ytd_gross_supplimental = ytd["gross_supplimental"]
+        income.ytd_gross_total = ytd["gross"] + ytd["gross_supplimental"]
+        income.ytd_withhold = ytd["withhold"]
+        income.ytd_rsu_quantity_remaining = ytd["rsu_quantity_remaining"]
+        income.ytd_rsu_quantity_vested = ytd["rsu_quantity_vested"]
+
+    def _savings(self, income):
+        "Sets the 401(k) YTD values of a salary income, see Savings._ytd()"
+        ytd = self.ytd
+        ytd["401k"] += income.contrib_401k
+        ytd["401k_match"] += income.contrib_401k_match
+        ytd["401k_post"] += income.contrib_401k_post
+        income.ytd_401k = ytd["401k"]
+        income.ytd_401k_match = ytd["401k_match"]
+        income.ytd_401k_post = ytd["401k_post"]
+        income.ytd_401k_total = (
+            ytd["401k"] + ytd["401k_match"] + ytd["401k_post"]
+        )
+
+    def _deductions(self, income):
+        "Sets deductions and their YTDs, see Pay._federal_deductions()"
+        income.deductions = income.contrib_401k
+        income.deductions += income.fsa
+        income.deductions += income.hsa
+        income.deductions += income.medical
+        income.deductions += income.dental
+        income.deductions += income.vision
+        income.deductions += income.vacation_buy
+        income.federal_taxable = income.gross - income.deductions
+        for attr in _YTD_DEDUCTIONS:
+            ytd_attr = f"ytd_{attr}"
+            self.ytd[ytd_attr] += getattr(income, attr)
+            setattr(income, ytd_attr, self.ytd[ytd_attr])
+
+    def _net(self, income):
+        "Sets net pay and its YTDs, see Pay._net()"
+        ytd = self.ytd
+        income.calc_net()
+        if income.kind == "salary":
+            if isinstance(self.fudge, float):
+                income.net += self.fudge
+                self.fudge = None
+            ytd["net"] += income.net
+        else:
+            ytd["net_supplimental"] += income.net
+        income.ytd_net = ytd["net"]
+        income.ytd_net_supplimental = ytd["net_supplimental"]
+        income.ytd_net_total = ytd["net"] + ytd["net_supplimental"]
@@ -2,7 +2,9 @@
 
 from math import floor, isclose
 
+from dateindex import DateIndex
 from income import Income
+from ledger import Ledger
 from log import error
 from stock import Stock
 
@@ -40,6 +42,10 @@ class ESPP:
     def __init__(self, cfg, income_list):
         self.cfg = cfg
         self.income = income_list
+        dates = None
+        if isinstance(income_list, Ledger):
+            dates = income_list.column("date")
+        self.index = DateIndex(income_list, dates)
         self.percent_discount = self.cfg.pay.espp.percent_discount / 100.0
         self.ytd = 0.0
         self.sums = {"first": 0.0, "second": 0.0}
@@ -72,9 +78,13 @@ class ESPP:
         """
         Withholds the correct ESPP amount for salaried paychecks in a range.
         """
-        sum_amount = 0.0
-        for income in self.income:
-            if date_start < income.date <= date_end:
+        if isinstance(self.income, Ledger):
+            sum_amount = self._withhold_columns(
+                self.index.span(date_start, date_end), percent, cap
+            )
+        else:
+            sum_amount = 0.0
+            for income in self.index.between(date_start, date_end):
                 if percent > 0 and income.kind == "salary":
                     amount = min(income.gross * percent, cap)
                     cap -= amount
@@ -86,6 +96,27 @@ class ESPP:
         if name:
             self.sums[name] = sum_amount
 
+    def _withhold_columns(self, indexes, percent, cap):
+        "Column version of ._withhold() for a Ledger, returns the sum"
+        col = self.income.column
+        kind, gross = col("kind"), col("gross")
+        percent_espp, espp, ytd_espp = (
+            col("percent_espp"),
+            col("espp"),
+            col("ytd_espp"),
+        )
+        sum_amount = 0.0
+        for index in indexes:
+            if percent > 0 and kind[index] == "salary":
+                amount = min(gross[index] * percent, cap)
+                cap -= amount
+                percent_espp[index] = percent
+                espp[index] = amount
+                self.ytd += amount
+                sum_amount += amount
+            ytd_espp[index] = self.ytd
+        return sum_amount
+
     def _buy(self, name):
         """
         Returns an Income object for either the first or second buy.
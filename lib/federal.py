@@ -1,53 +1,157 @@
 "Federal tax calculations"
 
+from bisect import bisect_left
+from functools import cache
+from itertools import accumulate
+
+from ledger import Ledger
+from optional import optional
+
+
+class Brackets:
+    """
+    A federal withholding table compiled for lookups. Band incomes are kept
+    sorted with the tax owed at each band's lower income and the highest
+    percent reached so far, so the tax on an amount is one bisect: the tax
+    at the band below it plus the amount over that band times its percent.
+    """
+
+    def __init__(self, table):
+        bands = {}
+        for income, percent in table:
+            if percent > 1.0:
+                percent /= 100.0
+            income = float(income)
+            bands[income] = max(bands.get(income, percent), percent)
+        self.incomes = sorted(bands)
+        self.percents = [bands[income] for income in self.incomes]
+        self.tops = list(accumulate(self.percents, max))
+        self.taxes = [0.0]
+        for index, percent in enumerate(self.percents[:-1]):
+            band = self.incomes[index + 1] - self.incomes[index]
+            self.taxes.append(self.taxes[-1] + band * percent)
+
+    def tax(self, amount):
+        "Returns (tax, top percent) on taxable amount"
+        index = bisect_left(self.incomes, amount) - 1
+        if index < 0:
+            return 0.0, 0.0
+        tax = amount - self.incomes[index]
+        tax = self.taxes[index] + tax * self.percents[index]
+        return tax, self.tops[index]
+
+    def taxes_for(self, amounts):
+        """
+        Returns (taxes, top percents) lists for a sequence of taxable
+        amounts, vectorized with NumPy when it's installed.
+        """
+        np = optional("numpy")
+        if np is None:
+            pairs = [self.tax(amount) for amount in amounts]
+            return [tax for tax, _ in pairs], [top for _, top in pairs]
+        amounts = np.asarray(amounts, dtype=float)
+        incomes = np.asarray(self.incomes)
+        index = np.searchsorted(incomes, amounts, side="left") - 1
+        below = index < 0
+        index[below] = 0
+        tax = amounts - incomes[index]
+        tax = (
+            np.asarray(self.taxes)[index]
+            + tax * np.asarray(self.percents)[index]
+        )
+        top = np.asarray(self.tops)[index]
+        tax[below] = top[below] = 0.0
+        return tax.tolist(), top.tolist()
+
+
+@cache
+def _brackets(table):
+    return Brackets(table)
+
+
+def brackets(table):
+    "Returns the Brackets for a federal table, compiled once per table"
+    return _brackets(tuple(tuple(band) for band in table))
+
 
 class Federal:
     "Federal tax"
 
-    def __init__(self, cfg, income_list):
+    def __init__(self, cfg, income_list=()):
         self.cfg = cfg
         self.income = income_list
-        self.table = []
-        for income, percent in cfg.federal.table:
-            if percent > 1.0:
-                percent /= 100.0
-            self.table.append((float(income), percent))
-        # NOTE: table must be reverse sorted for ._tax_salary()
-        self.table = sorted(self.table, reverse=True)
+        self.brackets = brackets(cfg.federal.table)
 
-        ytd_tax = ytd_gross_supplimental = 0.0
+        self.ytd_tax = self.ytd_gross_supplimental = 0.0
+        if isinstance(income_list, Ledger):
+            self._add_columns(income_list)
+            return
         for income in self.income:
-            if income.percent_tax_federal > 0.0:
-                percent = income.percent_tax_federal
-                tax = self._tax_manual(income)
-                ytd_gross_supplimental += income.gross
-            elif income.kind == "salary":
-                tax, percent = self._tax_salary(income)
+            self.add(income)
+
+    def add(self, income):
+        "Adds federal tax to the next income, incomes come in pay order"
+        tax, percent = self._tax(
+            income.percent_tax_federal,
+            income.kind,
+            income.gross,
+            income.federal_taxable,
+            income.personal_exemption,
+        )
+        self.ytd_tax += tax
+        income.tax_federal = tax
+        income.percent_tax_federal = percent
+        income.ytd_tax_federal = self.ytd_tax
+
+    def _add_columns(self, ledger):
+        """
+        Column version of .add() over a whole Ledger. Salary withholding
+        doesn't depend on earlier incomes so those rows are looked up in
+        the brackets at once, see Brackets.taxes_for().
+        """
+        # pylint: disable=too-many-locals
+        col = ledger.column
+        manual, kind = col("percent_tax_federal"), col("kind")
+        gross, taxable = col("gross"), col("federal_taxable")
+        exemption, tax_federal = col("personal_exemption"), col("tax_federal")
+        salary, rest = [], []
+        for index, value in enumerate(kind):
+            if manual[index] > 0.0 or value != "salary":
+                rest.append(index)
             else:
-                tax, percent = self._tax_supplimental(
-                    income, ytd_gross_supplimental
-                )
-                ytd_gross_supplimental += income.gross
-            ytd_tax += tax
-            income.tax_federal = tax
-            income.percent_tax_federal = percent
-            income.ytd_tax_federal = ytd_tax
-
-    def _tax_manual(self, income):
-        return income.federal_taxable * income.percent_tax_federal
-
-    def _tax_salary(self, income):
-        amount = income.federal_taxable - income.personal_exemption
-        tax = top_percent = 0.0
-        for band_income_max, band_percent in self.table:
-            if amount > band_income_max:
-                top_percent = max(top_percent, band_percent)
-                band_amount = amount - band_income_max
-                amount -= band_amount
-                tax += band_amount * band_percent
-        return tax, top_percent
-
-    def _tax_supplimental(self, income, ytd_gross):
+                salary.append(index)
+        taxes, percents = self.brackets.taxes_for(
+            [taxable[index] - exemption[index] for index in salary]
+        )
+        for index, tax, percent in zip(salary, taxes, percents):
+            tax_federal[index] = tax
+            manual[index] = percent
+        for index in rest:
+            tax_federal[index], manual[index] = self._tax(
+                manual[index],
+                kind[index],
+                gross[index],
+                taxable[index],
+                exemption[index],
+            )
+        ledger.cumulative("tax_federal", "ytd_tax_federal")
+        if len(ledger):
+            self.ytd_tax = col("ytd_tax_federal")[-1]
+
+    def _tax(self, manual, kind, gross, taxable, exemption):
+        "Returns (tax, percent) on the next income's values"
+        if manual > 0.0:
+            self.ytd_gross_supplimental += gross
+            return taxable * manual, manual
+        if kind == "salary":
+            return self.brackets.tax(taxable - exemption)
+        tax, percent = self._tax_supplimental(
+            gross, self.ytd_gross_supplimental
+        )
+        self.ytd_gross_supplimental += gross
+        return tax, percent
+
+    def _tax_supplimental(self, gross, ytd_gross):
         # Any non-salary employer grant is referred to as supplimental
         # income. The IRS requires employers to withhold based on YTD gross
         # supplimental income:
@@ -56,13 +160,13 @@ class Federal:
         # When a payment crosses the cap the gross pay is split into two
         # 22% and 37% taxable portions.
         percent_lo, percent_hi, cap = 0.22, 0.37, 1_000_000.0
-        if ytd_gross + income.gross <= cap:
-            return income.gross * percent_lo, percent_lo  # All pre-cap
+        if ytd_gross + gross <= cap:
+            return gross * percent_lo, percent_lo  # All pre-cap
         if ytd_gross > cap:
-            return income.gross * percent_hi, percent_hi  # All post-cap
+            return gross * percent_hi, percent_hi  # All post-cap
         # This payment straddles the cap and requires two portions.
-        amount_hi = (ytd_gross + income.gross) - cap
-        amount_lo = income.gross - amount_hi
+        amount_hi = (ytd_gross + gross) - cap
+        amount_lo = gross - amount_hi
         tax = amount_hi * percent_hi
         tax += amount_lo * percent_lo
         return tax, percent_hi
@@ -1,10 +1,15 @@
 "Git helpers"
 
+from functools import cache
 from subprocess import run, CalledProcessError, PIPE
 
+from profiler import count
 
+
+@cache
 def repo_version(repo):
     "Returns the version string for repo, unknown on errors"
+    count("git describe")
     try:
         result = run(
             ["git", "describe", "--always", "--long", "--dirty", "--tags"],
@@ -0,0 +1,78 @@
+"US bank holiday calendar"
+
+from calendar import monthrange
+from collections import namedtuple
+from datetime import date, timedelta
+from functools import cache
+
+from log import error
+
+MONDAY, THURSDAY, FRIDAY = 0, 3, 4  # date.weekday()
+
+# A holiday on a fixed month and day, or on the nth weekday of the month
+# (nth -1 is the last one). since is the first year it's observed.
+Rule = namedtuple("Rule", "name month day weekday nth since")
+
+# https://www.chicagofed.org/utilities/about-us/bank-holidays
+RULES = {
+    "us": (
+        Rule("New Year's", 1, 1, None, None, None),
+        Rule("MLK", 1, None, MONDAY, 3, None),
+        Rule("Presidents", 2, None, MONDAY, 3, None),
+        Rule("Memorial", 5, None, MONDAY, -1, None),
+        Rule("Juneteenth", 6, 19, None, None, 2021),
+        Rule("Independence", 7, 4, None, None, None),
+        Rule("Labor", 9, None, MONDAY, 1, None),
+        Rule("Colombus", 10, None, MONDAY, 2, None),
+        Rule("Veterans", 11, 11, None, None, None),
+        Rule("Thanksgiving", 11, None, THURSDAY, 4, None),
+        Rule("Christmas", 12, 25, None, None, None),
+    ),
+}
+
+
+def _nth_weekday(year, month, weekday, nth):
+    "Returns the date of the nth weekday of month, -1 for the last one"
+    if nth < 0:
+        last = date(year, month, monthrange(year, month)[1])
+        return last - timedelta(days=(last.weekday() - weekday) % 7)
+    first = date(year, month, 1)
+    offset = (weekday - first.weekday()) % 7
+    return first + timedelta(days=offset + 7 * (nth - 1))
+
+
+@cache
+def holidays(year, country="us"):
+    "Returns the frozenset of bank holiday dates in year"
+    if country not in RULES:
+        error(f"no bank holiday rules for country '{country}'")
+    days = set()
+    for rule in RULES[country]:
+        if rule.since is not None and year < rule.since:
+            continue
+        if rule.day is None:
+            days.add(_nth_weekday(year, rule.month, rule.weekday, rule.nth))
+        else:
+            days.add(date(year, rule.month, rule.day))
+    return frozenset(days)
+
+
+@cache
+def paydays(year, country="us"):
+    """
+    Returns the 24 semimonthly paydays of year as (month, day) pairs. Pay
+    is on the 15th and the last day of the month, pulled back a day at a
+    time while it's a bank holiday then back to Friday from a weekend.
+    """
+    days = holidays(year, country)
+    table = []
+    for month in range(1, 13):
+        for day in (15, monthrange(year, month)[1]):
+            payday = date(year, month, day)
+            # Adjust bank holidays first: may move payday to a weekend
+            while payday in days:
+                payday -= timedelta(days=1)
+            if payday.weekday() > FRIDAY:
+                payday -= timedelta(days=payday.weekday() - FRIDAY)
+            table.append((payday.month, payday.day))
+    return tuple(table)
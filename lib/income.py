@@ -1,87 +1,187 @@
 "Income class"
 
 from datetime import datetime
+from operator import attrgetter
+
 from log import error
 
-# We'll catch asymmetric attributes during validation for .csv()
+# Fields are set through the compiled schema
 # pylint: disable=no-member,attribute-defined-outside-init
 
 
+# Fields that aren't floats, everything else starts out as 0.0.
+_DATE, _KIND = "date", "kind"
+
+# (attribute, CSV title) for every Income field, in CSV column order.
+_SCHEMA = (
+    ("date", "Pay Date"),
+    ("kind", "Payment Type"),
+    ("gross", "Gross Pay"),
+    ("ytd_gross", "Gross Pay YTD"),
+    ("ytd_gross_supplimental", "Gross Supplimental YTD"),
+    ("ytd_gross_total", "Gross Total YTD"),
+    ("net", "Net Pay"),
+    ("ytd_net", "Net Pay YTD"),
+    ("ytd_net_supplimental", "Net Supplimental YTD"),
+    ("ytd_net_total", "Net Total YTD"),
+    ("contrib_401k", "401(k) Contribution"),
+    ("percent_401k", "401(k) Contribution Percent"),
+    ("ytd_401k", "401(k) Contribution YTD"),
+    ("contrib_401k_match", "401(k) Company Match"),
+    ("ytd_401k_match", "401(k) Company Match YTD"),
+    ("contrib_401k_post", "401(k) Post-tax Contribution"),
+    ("percent_401k_post", "401(k) Post-tax Percent"),
+    ("ytd_401k_post", "401(k) Post-tax YTD"),
+    ("ytd_401k_total", "401(k) Total YTD"),
+    ("deductions", "Federal Tax Deduction"),
+    ("personal_exemption", "Federal Personal Exemption"),
+    ("term_life", "Term Life Insurance"),
+    ("ytd_term_life", "Term Life Insurance YTD"),
+    ("fsa", "Flexible Spending Account"),
+    ("ytd_fsa", "Flexible Spending Account YTD"),
+    ("hsa", "Health Savings Account"),
+    ("ytd_hsa", "Health Savings Account YTD"),
+    ("medical", "Medical Plan"),
+    ("ytd_medical", "Medical Plan YTD"),
+    ("dental", "Dental Plan"),
+    ("ytd_dental", "Dental Plan YTD"),
+    ("vision", "Vision Plan"),
+    ("ytd_vision", "Vision Plan YTD"),
+    ("federal_taxable", "Federal Taxable Amount"),
+    ("percent_tax_federal", "Federal Tax Percent"),
+    ("tax_federal", "Federal Tax"),
+    ("ytd_tax_federal", "Federal Tax YTD"),
+    ("tax_social", "Social Security Tax"),
+    ("ytd_tax_social", "Social Security Tax YTD"),
+    ("tax_medicare", "Medicare Tax"),
+    ("ytd_tax_medicare", "Medicare Tax YTD"),
+    ("tax_medicare_surtax", "Medicare Surtax"),
+    ("ytd_tax_medicare_surtax", "Medicare Surtax YTD"),
+    ("tax_medicare_total", "Medicare Tax Total"),
+    ("ytd_tax_medicare_total", "Medicare Tax Total YTD"),
+    ("rsu_quantity", "RSU Quantity"),
+    ("ytd_rsu_quantity_vested", "RSU Quantity Vested YTD"),
+    ("ytd_rsu_quantity_remaining", "RSU Quantity Remaining YTD"),
+    ("rsu_vest_price", "RSU Vest Price"),
+    ("vacation_buy", "Vacation buy"),
+    ("ytd_vacation_buy", "Vacation buy YTD"),
+    ("withhold", "Withhold"),
+    ("ytd_withhold", "Withhold YTD"),
+    ("percent_espp", "ESPP Percent"),
+    ("espp", "ESPP"),
+    ("ytd_espp", "ESPP YTD"),
+)
+
+
+def _compile(schema):
+    """
+    Checks schema once and returns (pad, header, row format, float fields)
+    for the Income class. The row format turns a tuple of every field value
+    into the CSV row: floats to 4 places and the date as MM/DD/YY.
+    """
+    pad, specs = 0, []
+    for attr, title in schema:
+        if "," in title:
+            error(f"comma in Income title '{title}'")
+        pad = max(pad, len(title))
+        if attr == _DATE:
+            specs.append("%D")
+        elif attr == _KIND:
+            specs.append("")
+        else:
+            specs.append(".4f")
+    header = ",".join(title for _, title in schema)
+    row = ",".join(f"{{{index}:{spec}}}" for index, spec in enumerate(specs))
+    floats = tuple(attr for attr, _ in schema if attr not in (_DATE, _KIND))
+    return pad, header, row, floats
+
+
+def quote(field):
+    "Returns str field quoted for CSV when it needs quoting"
+    if any(char in field for char in ',"\r\n'):
+        return '"' + field.replace('"', '""') + '"'
+    return field
+
+
+def projection(columns):
+    """
+    Returns (header, row function) for a CSV of only the Income fields in
+    columns, in that order. The row function returns one income's values.
+    """
+    titles = dict(_SCHEMA)
+    for column in columns:
+        if column not in titles:
+            error(f"no Income column '{column}'")
+    columns = tuple(columns)
+    _, header, row, _ = _compile(tuple((col, titles[col]) for col in columns))
+    kind_index = columns.index(_KIND) if _KIND in columns else None
+
+    def values(income):
+        fields = [getattr(income, attr) for attr in columns]
+        if kind_index is not None:
+            fields[kind_index] = quote(fields[kind_index])
+        return row.format(*fields)
+
+    return header, values
+
+
+_PAD, _HEADER, _ROW, _FLOATS = _compile(_SCHEMA)
+_VALUES = attrgetter(*(attr for attr, _ in _SCHEMA))
+_KIND_INDEX = [attr for attr, _ in _SCHEMA].index(_KIND)
+_FLOAT_VALUES = attrgetter(*_FLOATS)
+
+
 class Income:
-    "A general purpose Income class."
+    """
+    A general purpose Income class.
+
+    The field schema is compiled once for the class: instances use slots
+    for storage and share the CSV header, row format and validation plan.
+    """
+
+    __slots__ = tuple(attr for attr, _ in _SCHEMA)
+    _attrs = _SCHEMA
+    _pad = _PAD
+    HEADER = _HEADER
+    # Fields only salary may have and fields every other kind must have.
+    SALARY_ONLY = (
+        "personal_exemption",
+        "contrib_401k",
+        "contrib_401k_post",
+        "contrib_401k_match",
+        "fsa",
+        "hsa",
+        "medical",
+        "dental",
+        "vision",
+        "vacation_buy",
+    )
+    REQUIRED = (
+        "gross",
+        "federal_taxable",
+        "tax_federal",
+        "tax_medicare_total",
+    )
 
     def __init__(self, date, gross, kind="salary"):
-        self._pad = 0
-        self._attrs = [
-            ("date", "Pay Date"),
-            ("kind", "Payment Type"),
-            ("gross", "Gross Pay"),
-            ("ytd_gross", "Gross Pay YTD"),
-            ("ytd_gross_supplimental", "Gross Supplimental YTD"),
-            ("ytd_gross_total", "Gross Total YTD"),
-            ("net", "Net Pay"),
-            ("ytd_net", "Net Pay YTD"),
-            ("ytd_net_supplimental", "Net Supplimental YTD"),
-            ("ytd_net_total", "Net Total YTD"),
-            ("contrib_401k", "401(k) Contribution"),
-            ("percent_401k", "401(k) Contribution Percent"),
-            ("ytd_401k", "401(k) Contribution YTD"),
-            ("contrib_401k_match", "401(k) Company Match"),
-            ("ytd_401k_match", "401(k) Company Match YTD"),
-            ("contrib_401k_post", "401(k) Post-tax Contribution"),
-            ("percent_401k_post", "401(k) Post-tax Percent"),
-            ("ytd_401k_post", "401(k) Post-tax YTD"),
-            ("ytd_401k_total", "401(k) Total YTD"),
-            ("deductions", "Federal Tax Deduction"),
-            ("personal_exemption", "Federal Personal Exemption"),
-            ("term_life", "Term Life Insurance"),
-            ("ytd_term_life", "Term Life Insurance YTD"),
-            ("fsa", "Flexible Spending Account"),
-            ("ytd_fsa", "Flexible Spending Account YTD"),
-            ("hsa", "Health Savings Account"),
-            ("ytd_hsa", "Health Savings Account YTD"),
-            ("medical", "Medical Plan"),
-            ("ytd_medical", "Medical Plan YTD"),
-            ("dental", "Dental Plan"),
-            ("ytd_dental", "Dental Plan YTD"),
-            ("vision", "Vision Plan"),
-            ("ytd_vision", "Vision Plan YTD"),
-            ("federal_taxable", "Federal Taxable Amount"),
-            ("percent_tax_federal", "Federal Tax Percent"),
-            ("tax_federal", "Federal Tax"),
-            ("ytd_tax_federal", "Federal Tax YTD"),
-            ("tax_social", "Social Security Tax"),
-            ("ytd_tax_social", "Social Security Tax YTD"),
-            ("tax_medicare", "Medicare Tax"),
-            ("ytd_tax_medicare", "Medicare Tax YTD"),
-            ("tax_medicare_surtax", "Medicare Surtax"),
-            ("ytd_tax_medicare_surtax", "Medicare Surtax YTD"),
-            ("tax_medicare_total", "Medicare Tax Total"),
-            ("ytd_tax_medicare_total", "Medicare Tax Total YTD"),
-            ("rsu_quantity", "RSU Quantity"),
-            ("ytd_rsu_quantity_vested", "RSU Quantity Vested YTD"),
-            ("ytd_rsu_quantity_remaining", "RSU Quantity Remaining YTD"),
-            ("rsu_vest_price", "RSU Vest Price"),
-            ("vacation_buy", "Vacation buy"),
-            ("ytd_vacation_buy", "Vacation buy YTD"),
-            ("withhold", "Withhold"),
-            ("ytd_withhold", "Withhold YTD"),
-            ("percent_espp", "ESPP Percent"),
-            ("espp", "ESPP"),
-            ("ytd_espp", "ESPP YTD"),
-        ]
-        for attr, title in self._attrs:
-            if "," in title:
-                error(f"comma in Income title '{title}'")
-            self._pad = max(self._pad, len(title))
-            value = 0.0
-            if attr == "date":
-                value = date
-            elif attr == "gross":
-                value = float(gross)
-            elif attr == "kind":
-                value = kind
-            setattr(self, attr, value)
+        for attr in _FLOATS:
+            setattr(self, attr, 0.0)
+        self.date = date
+        self.gross = float(gross)
+        self.kind = kind
+
+    def fica_wage(self, term_life):
+        "Returns the Medicare and Social Security taxable wage"
+        amount = self.gross
+        if self.kind == "salary":
+            amount += term_life
+            amount -= self.fsa
+            amount -= self.hsa
+            amount -= self.dental
+            amount -= self.medical
+            amount -= self.vision
+            amount -= self.vacation_buy
+        return amount
 
     def calc_net(self):
         "calculate final (net) income"
@@ -103,47 +203,30 @@ class Income:
         self._validate()
 
     def _validate(self):
-        for attr in vars(self):
-            if not attr[0] == "_":
-                value = getattr(self, attr)
-                if isinstance(value, float) and value < 0.0:
+        values = _FLOAT_VALUES(self)
+        if min(values) < 0.0:
+            for attr, value in zip(_FLOATS, values):
+                if value < 0.0:
                     error(f"attr {attr} is negative {value}")
         if self.kind != "salary":
-            for attr in (
-                "personal_exemption",
-                "contrib_401k",
-                "contrib_401k_post",
-                "contrib_401k_match",
-                "fsa",
-                "hsa",
-                "medical",
-                "dental",
-                "vision",
-                "vacation_buy",
-            ):
+            for attr in self.SALARY_ONLY:
                 if getattr(self, attr) > 0.0:
                     error(f"Income '{attr}' > 0.0")
-            for attr in (
-                "gross",
-                "federal_taxable",
-                "tax_federal",
-                "tax_medicare_total",
-            ):
+            for attr in self.REQUIRED:
                 if getattr(self, attr) <= 0.0:
                     error(f"Income '{attr}' <= 0.0")
 
     def csv(self):
         "Returns a header, values in CSV format for income"
-        header, values = [], []
-        for attr, title in self._attrs:
-            header.append(title)
-            value = getattr(self, attr)
-            if isinstance(value, float):
-                value = f"{value:.4f}"
-            elif isinstance(value, datetime):
-                value = value.strftime("%D")
-            values.append(value)
-        return ",".join(header), ",".join(values)
+        return self.HEADER, self.csv_values()
+
+    def csv_values(self):
+        "Returns the values in CSV format for income"
+        values, kind = _VALUES(self), quote(self.kind)
+        if kind != self.kind:
+            values = list(values)
+            values[_KIND_INDEX] = kind  # Only the kind is free text
+        return _ROW.format(*values)
 
     def __lt__(self, obj):
         # This is implemented to make sorting lists of income objects into
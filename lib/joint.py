@@ -0,0 +1,140 @@
+"Joint pre-tax and post-tax 401k schedule search"
+
+from concurrent.futures import ProcessPoolExecutor
+
+from log import error
+
+OBJECTIVES = ("changes", "variance")
+
+
+class Joint:
+    """
+    Searches pre-tax and post-tax contribution schedules together instead of
+    pre-tax first and post-tax on whatever cap the employer match leaves.
+
+    Every pre-tax schedule over the pre-tax cap is paired with every post-tax
+    schedule over the post-tax cap that pre-tax schedule leaves behind. Pairs
+    are ranked by objective:
+      changes  : fewest percent changes across both schedules, then the
+                 least varying pre-tax take home pay
+      variance : least varying pre-tax take home pay, then fewest changes
+    followed by the smallest total amount over both caps. The last tie-break
+    is the schedules themselves, so the result is the same for any number
+    of workers.
+
+    Pre-tax schedules are split across a pool of workers processes.
+    """
+
+    def __init__(self, savings, objective="changes", workers=1):
+        if objective not in OBJECTIVES:
+            error(f"invalid joint objective '{objective}'")
+        if savings.cfg.save.change_dates:
+            error("joint optimization doesn't support change_dates")
+        self.savings = savings
+        self.objective = objective
+        self.workers = max(int(workers), 1)
+
+    def _jobs(self):
+        "Returns the list of worker jobs, pre-tax schedules split evenly"
+        savings = self.savings
+        cap = float(savings.cfg.save.cap)
+        gross = [income.gross for income in savings.salary]
+        percent_match = savings.cfg.save.percent_match / 100.0
+        # The match shrinks the post-tax cap by at most the smaller of the
+        # pre-tax cap and a full year of matched gross.
+        cap_post_high = cap - savings.cap_pre
+        cap_post_low = cap_post_high - min(
+            savings.cap_pre, sum(gross) * percent_match
+        )
+        pre = savings.schedules("pre", savings.cap_pre, savings.cap_pre)
+        post = savings.schedules("post", cap_post_low, cap_post_high)
+        count = min(self.workers * 4, len(pre)) or 1
+        size = -(-len(pre) // count)
+        return [
+            (
+                pre[index : index + size],
+                post,
+                gross,
+                savings.cap_pre,
+                cap,
+                percent_match,
+                self.objective,
+            )
+            for index in range(0, len(pre), size)
+        ]
+
+    def solve(self):
+        """
+        Returns (best_pre, best_post) lists of percentages, (None, None) when
+        no pair gets over both caps.
+        """
+        jobs = self._jobs()
+        if self.workers == 1 or len(jobs) < 2:
+            results = map(_best, jobs)
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                results = list(pool.map(_best, jobs))
+        results = [result for result in results if result is not None]
+        if not results:
+            return None, None
+        best = min(results)
+        return list(best[-2]), list(best[-1])
+
+
+def _changes(percents):
+    "Returns the number of paycheck to paycheck percent changes"
+    return sum(1 for a, b in zip(percents, percents[1:]) if a != b)
+
+
+def _best(job):
+    """
+    Worker: returns the smallest (objective key, pre, post) tuple for a job,
+    None when no pair gets over both caps. Contributions are clipped and
+    matched the same way Savings applies them.
+    """
+    # pylint: disable=too-many-locals,unsubscriptable-object
+    pre_list, post_list, gross, cap_pre, cap, percent_match, objective = job
+    post_list = [
+        (
+            post,
+            amount,
+            _changes(post),
+            [g * (p / 100.0) for g, p in zip(gross, post)],
+        )
+        for post, amount in post_list
+    ]
+    best = None
+    for pre, amount_pre in pre_list:
+        left_pre, ytd_left, cap_post = [], cap_pre, cap - cap_pre
+        for value, percent in zip(gross, pre):
+            contrib = min(value * (percent / 100.0), ytd_left)
+            ytd_left -= contrib
+            cap_post -= min(value * percent_match, contrib)
+            left_pre.append(value - contrib)
+        changes_pre = _changes(pre)
+        for post, amount_post, changes_post, wanted in post_list:
+            if amount_post <= cap_post:
+                continue
+            changes = changes_pre + changes_post
+            if (
+                objective == "changes"
+                and best is not None
+                and changes > best[0]
+            ):
+                continue
+            take_home, ytd_left = [], cap_post
+            for left, contrib in zip(left_pre, wanted):
+                contrib = min(contrib, ytd_left)
+                ytd_left -= contrib
+                take_home.append(left - contrib)
+            mean = sum(take_home) / len(take_home)
+            variance = sum((x - mean) ** 2 for x in take_home) / len(take_home)
+            over = (amount_pre - cap_pre) + (amount_post - cap_post)
+            if objective == "changes":
+                key = (changes, variance, over)
+            else:
+                key = (variance, changes, over)
+            key += (tuple(pre), tuple(post))
+            if best is None or key < best:
+                best = key
+    return best
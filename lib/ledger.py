@@ -0,0 +1,207 @@
+"Columnar income ledger"
+
+from array import array
+from bisect import bisect_right
+from itertools import accumulate, compress, count, groupby, repeat
+from operator import add, sub
+
+from income import Income
+from log import error
+
+# Columns that aren't floats and so can't live in an array('d').
+_OBJECT_COLUMNS = ("date", "kind")
+
+
+class Ledger:
+    """
+    A list of Income entries stored by column: one contiguous array('d') per
+    float field of Income plus plain lists for the date and kind. Whole
+    columns are available through .column() for passes that work a field at
+    a time, and iterating or indexing yields Row views so existing code that
+    reads and writes Income attributes keeps working unchanged.
+    """
+
+    def __init__(self, income_list=()):
+        self.columns = {}
+        for attr in Income.__slots__:
+            if attr in _OBJECT_COLUMNS:
+                self.columns[attr] = []
+            else:
+                self.columns[attr] = array("d")
+        for income in income_list:
+            self.append(income)
+
+    def append(self, income):
+        "Appends the fields of an Income (or Row) as a new row"
+        for attr, column in self.columns.items():
+            column.append(getattr(income, attr))
+
+    @classmethod
+    def from_columns(cls, length, values):
+        """
+        Returns a Ledger of length rows from a dict of column values, the
+        float columns left out are all 0.0
+        """
+        ledger = cls()
+        for attr, column in ledger.columns.items():
+            if attr in values:
+                column.extend(values[attr])
+            elif attr not in _OBJECT_COLUMNS:
+                column.extend(repeat(0.0, length))
+            if len(column) != length:
+                error(f"ledger column '{attr}' wrong length {len(column)}")
+        return ledger
+
+    def merged(self, income_list):
+        """
+        Returns a new Ledger of these rows and a date ordered list of
+        incomes in pay order, rows paid the same day as an income first
+        """
+        # pylint: disable=too-many-locals
+        # Splice runs of rows and incomes, (source, start, stop) slices.
+        dates, runs, done, taken = self.columns["date"], [], 0, 0
+        for position, group in groupby(
+            bisect_right(dates, income.date) for income in income_list
+        ):
+            size = len(list(group))
+            runs += [(0, done, position), (1, taken, taken + size)]
+            done, taken = position, taken + size
+        runs.append((0, done, len(dates)))
+        ledger = Ledger()
+        for attr, column in ledger.columns.items():
+            sources = self.columns[attr], [
+                getattr(income, attr) for income in income_list
+            ]
+            for source, start, stop in runs:
+                column.extend(sources[source][start:stop])
+        return ledger
+
+    def column(self, attr):
+        "Returns the column for attr, writes go straight to the ledger"
+        if attr not in self.columns:
+            error(f"no ledger column '{attr}'")
+        return self.columns[attr]
+
+    def set_column(self, attr, values):
+        "Replaces every value of column attr"
+        column = self.column(attr)
+        if attr in _OBJECT_COLUMNS:
+            values = list(values)
+        else:
+            values = array("d", values)
+        if len(values) != len(column):
+            error(f"ledger column '{attr}' wrong length {len(values)}")
+        column[:] = values
+
+    def cumulative(self, attr, ytd_attr):
+        "Sets column ytd_attr to the running total of column attr"
+        self.set_column(ytd_attr, accumulate(self.column(attr)))
+
+    def fica_wages(self, term_life):
+        "Column version of Income.fica_wage(), returns every row's wage"
+        wages = array("d", self.columns["gross"])
+        salary = [kind == "salary" for kind in self.columns["kind"]]
+        amounts = map(add, compress(wages, salary), repeat(term_life))
+        # Same order as Income.fica_wage() so the sums round alike.
+        for attr in (
+            "fsa",
+            "hsa",
+            "dental",
+            "medical",
+            "vision",
+            "vacation_buy",
+        ):
+            amounts = map(sub, amounts, compress(self.columns[attr], salary))
+        for index, amount in zip(compress(count(), salary), list(amounts)):
+            wages[index] = amount
+        return wages
+
+    def validate(self):
+        """
+        Validates every row as Income does, erroring on the first bad row.
+        Whole columns are checked first, rows only once one fails.
+        """
+        if not self.columns["date"]:
+            return
+        others = [kind != "salary" for kind in self.columns["kind"]]
+        if (
+            all(
+                min(column) >= 0.0
+                for column in self.columns.values()
+                if isinstance(column, array)
+            )
+            and all(
+                max(compress(self.columns[attr], others), default=0.0) <= 0.0
+                for attr in Income.SALARY_ONLY
+            )
+            and all(
+                min(compress(self.columns[attr], others), default=1.0) > 0.0
+                for attr in Income.REQUIRED
+            )
+        ):
+            return
+        for row in self:
+            row._validate()  # pylint: disable=protected-access
+
+    def income(self, indexes=None):
+        """
+        Returns the rows, or just those at indexes, copied out as a list of
+        plain Income objects
+        """
+        if indexes is None:
+            indexes = range(len(self))
+        copies = []
+        for index in indexes:
+            income = Income(None, 0.0)
+            for attr, column in self.columns.items():
+                setattr(income, attr, column[index])
+            copies.append(income)
+        return copies
+
+    def store(self, indexes, income_list, attrs):
+        "Writes attrs of each income back to its row, see .income()"
+        for attr in attrs:
+            column = self.column(attr)
+            for index, income in zip(indexes, income_list):
+                column[index] = getattr(income, attr)
+
+    def __len__(self):
+        return len(self.columns["date"])
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError("ledger index out of range")
+        return Row(self, index % len(self))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield Row(self, index)
+
+
+class Row(Income):
+    """
+    An Income view of one Ledger row. It has no storage of its own: every
+    field read and write goes to the ledger's columns.
+    """
+
+    __slots__ = ("_ledger", "_index")
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, ledger, index):
+        object.__setattr__(self, "_ledger", ledger)
+        object.__setattr__(self, "_index", index)
+
+    def __getattr__(self, attr):
+        # Only called for Income fields, a Row never fills in their slots.
+        if attr in Row.__slots__:
+            raise AttributeError(attr)
+        column = self._ledger.columns.get(attr)
+        if column is None:
+            raise AttributeError(attr)
+        return column[self._index]
+
+    def __setattr__(self, attr, value):
+        column = self._ledger.columns.get(attr)
+        if column is None:
+            error(f"no ledger column '{attr}'")
+        column[self._index] = value
@@ -1,11 +1,20 @@
 "Logging interface"
 
-from sys import exit as sys_exit
 from sys import stdout, stderr
 
+from profiler import count
+
 _VERBOSE = 0
 
 
+class ErrorExit(SystemExit):
+    "Raised by error(), exits with status 1 unless caught"
+
+    def __init__(self, msg):
+        super().__init__(1)
+        self.msg = msg
+
+
 def verbose_level(level=None):
     "Sets/get the verbosity level"
     global _VERBOSE  # pylint: disable=global-statement
@@ -16,8 +25,9 @@ def verbose_level(level=None):
 
 def _msg(msg, prefix, level, writer):
     "Emit information if level is met"
-    msg = str(msg)
     if level <= _VERBOSE:
+        msg = str(msg)  # Only format what's emitted, e.g. Income objects
+        count("log messages")
         if prefix:
             writer.write(prefix)
         writer.write(msg)
@@ -39,4 +49,4 @@ def warn(msg):
 def error(msg):
     "Emit error messages"
     _msg(msg=msg, prefix="error: ", level=0, writer=stderr)
-    sys_exit(1)
+    raise ErrorExit(str(msg))
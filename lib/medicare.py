@@ -1,33 +1,73 @@
 "Medicare tax"
 
+from itertools import accumulate, repeat
+from operator import add, mul
+
+from ledger import Ledger
+
 
 class Medicare:
     "Medicare tax"
 
-    def __init__(self, cfg, income_list):
-        cap = float(cfg.medicare.surtax_cap)
-        percent = cfg.medicare.percent / 100.0
-        percent_surtax = cfg.medicare.surtax_percent / 100.0
-        ytd = ytd_surtax = ytd_gross = 0.0
+    def __init__(self, cfg, income_list=()):
+        self.cap = float(cfg.medicare.surtax_cap)
+        self.percent = cfg.medicare.percent / 100.0
+        self.percent_surtax = cfg.medicare.surtax_percent / 100.0
+        self.ytd = self.ytd_surtax = self.ytd_gross = 0.0
+        if isinstance(income_list, Ledger):
+            self._add_columns(income_list, cfg.pay.term_life)
+            return
         for income in income_list:
-            amount = income.gross
-            if income.kind == "salary":
-                amount += cfg.pay.term_life
-                amount -= income.fsa
-                amount -= income.hsa
-                amount -= income.dental
-                amount -= income.medical
-                amount -= income.vision
-                amount -= income.vacation_buy
-            amount_surtax = max(ytd_gross + amount - cap, 0.0)
-            amount_surtax = min(amount_surtax, amount)
-            ytd_gross += amount
-            tax = amount * percent
-            surtax = amount_surtax * percent_surtax
-            ytd += tax
-            ytd_surtax += surtax
-            income.tax_medicare = tax
-            income.tax_medicare_surtax = surtax
-            income.ytd_tax_medicare = ytd
-            income.ytd_tax_medicare_surtax = ytd_surtax
-            income.ytd_tax_medicare_total = ytd + ytd_surtax
+            self.add(income, income.fica_wage(cfg.pay.term_life))
+
+    def add(self, income, amount):
+        """
+        Adds Medicare tax on amount, the FICA taxable wage, to the next
+        income, incomes come in pay order
+        """
+        tax, surtax = self._tax(amount)
+        income.tax_medicare = tax
+        income.tax_medicare_surtax = surtax
+        income.ytd_tax_medicare = self.ytd
+        income.ytd_tax_medicare_surtax = self.ytd_surtax
+        income.ytd_tax_medicare_total = self.ytd + self.ytd_surtax
+
+    def _add_columns(self, ledger, term_life):
+        """
+        Column version of .add() over a whole Ledger, the surtax only
+        depends on the running FICA wage total
+        """
+        wages = ledger.fica_wages(term_life)
+        ytd_gross = list(accumulate(wages))
+        ledger.set_column(
+            "tax_medicare", map(mul, wages, repeat(self.percent))
+        )
+        ledger.set_column(
+            "tax_medicare_surtax",
+            (
+                min(max(total - self.cap, 0.0), amount) * self.percent_surtax
+                for total, amount in zip(ytd_gross, wages)
+            ),
+        )
+        ledger.cumulative("tax_medicare", "ytd_tax_medicare")
+        ledger.cumulative("tax_medicare_surtax", "ytd_tax_medicare_surtax")
+        col = ledger.column
+        ledger.set_column(
+            "ytd_tax_medicare_total",
+            map(add, col("ytd_tax_medicare"), col("ytd_tax_medicare_surtax")),
+        )
+        if ytd_gross:
+            self.ytd_gross = ytd_gross[-1]
+            self.ytd = col("ytd_tax_medicare")[-1]
+            self.ytd_surtax = col("ytd_tax_medicare_surtax")[-1]
+
+    def _tax(self, amount):
+        "Returns (tax, surtax) on the next income's FICA taxable wage"
+        amount_surtax = max(self.ytd_gross + amount - self.cap, 0.0)
+        amount_surtax = min(amount_surtax, amount)
+        self.ytd_gross += amount
+        tax = amount * self.percent
+        surtax = amount_surtax * self.percent_surtax
+        self.ytd += tax
+        self.ytd_surtax += surtax
+        return tax, surtax
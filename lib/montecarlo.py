@@ -0,0 +1,283 @@
+"Monte Carlo simulation of RSU and ESPP stock prices"
+
+from math import isclose, log, sqrt
+from pathlib import Path
+
+from log import error
+from optional import optional
+from pay import Pay
+from stock import Stock
+
+MODELS = ("gbm", "bootstrap")
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+_TRADING_DAYS = 252  # Per year, the GBM time unit
+_CHUNK = 1 << 14  # Paths simulated at once, bounds memory
+_BOOTSTRAP_DAYS = 32  # Days of returns drawn at once per interval
+
+# Supplimental withholding, see Federal._tax_supplimental().
+_PERCENT_LO, _PERCENT_HI, _CAP = 0.22, 0.37, 1_000_000.0
+
+
+def history(filename):
+    """
+    Returns an array of daily log returns from a price history file. Each
+    line's last comma separated field is a closing price, oldest first;
+    lines without a price (headers) are skipped.
+    """
+    np = optional("numpy")
+    if np is None:
+        error("Monte Carlo simulation requires numpy")
+    prices = []
+    for line in Path(filename).read_text(encoding="utf-8").splitlines():
+        try:
+            prices.append(float(line.rsplit(",", 1)[-1]))
+        except ValueError:
+            continue
+    if len(prices) < 2 or min(prices) <= 0.0:
+        error(f"need two or more positive prices in '{filename}'")
+    return np.diff(np.log(np.array(prices)))
+
+
+class MonteCarlo:
+    """
+    Estimates the distribution of year-end totals when the stock price
+    follows random paths instead of one fixed price.
+
+    The config is estimated once. Every future RSU vest is then re-priced
+    at each path's price on its date, as is every future ESPP buy that
+    isn't locked with price_buy_*: it buys at the lower of price_start_*
+    and the path price. Past vests and buys keep their estimated values.
+    Paths start at price, today's price by default.
+
+    For each path the supplimental gross, federal supplimental withholding
+    (including the 22%/37% crossover at $1M YTD), Social Security and
+    Medicare taxes on every income and the net total are recomputed in pay
+    order. Salary withholding and deductions don't depend on the stock
+    price and come from the single estimate. Everything is vectorized
+    across paths, which are simulated in chunks.
+
+    Models:
+      gbm       : geometric Brownian motion with yearly drift mu and
+                  volatility sigma, over trading days
+      bootstrap : daily log returns drawn with replacement from returns
+    """
+
+    def __init__(self, cfg, price=None, log_level=0):
+        if optional("numpy") is None:
+            error("Monte Carlo simulation requires numpy")
+        self.cfg = cfg
+        self.pay = Pay(cfg, log_level)
+        if price is None:
+            price = cfg.rsu_price
+        if price is None:
+            price = Stock(cfg.rsu_url).price()
+        self.price = float(price)
+        if self.price <= 0.0:
+            error(f"bad Monte Carlo start price {self.price}")
+        self.dates, self.rsu, self.espp = [], [], []
+        self._rows()
+
+    def _rows(self):
+        """
+        Splits the estimate into fixed per-row arrays and the rows whose
+        gross follows the stock price.
+        """
+        # pylint: disable=too-many-locals
+        np = optional("numpy")
+        today, espp = self.cfg.today(), self.cfg.pay.espp
+        percent_discount = espp.percent_discount / 100.0
+        buys = {espp.date_first: "first", espp.date_second: "second"}
+        count = len(self.pay.income)
+        self.gross = np.zeros(count)
+        self.wage = np.zeros(count)
+        self.manual = np.zeros(count)
+        self.supplimental = np.zeros(count, dtype=bool)
+        self.net_fixed = 0.0
+        for row, income in enumerate(self.pay.income):
+            if income.kind == "salary":
+                self.wage[row] = income.fica_wage(self.cfg.pay.term_life)
+                self.net_fixed += income.net
+                self.net_fixed += income.tax_social
+                self.net_fixed += income.tax_medicare_total
+                continue
+            self.supplimental[row] = True
+            self.gross[row] = income.gross
+            self.manual[row] = self.pay.manual[row]
+            if income.date <= today:
+                continue
+            if income.kind == "rsu":
+                self.rsu.append((row, income.date, income.rsu_quantity))
+            elif income.kind == "espp" and income.date in buys:
+                name = buys[income.date]
+                if not isclose(getattr(espp, f"price_buy_{name}"), 0.0):
+                    continue  # Locked buy price
+                amount = self._espp_amount(name)
+                amount += amount * percent_discount
+                start = getattr(espp, f"price_start_{name}")
+                self.espp.append((row, income.date, amount, start))
+        self.dates = sorted(
+            {date for _, date, _ in self.rsu}
+            | {date for _, date, _, _ in self.espp}
+        )
+        index = {date: at for at, date in enumerate(self.dates)}
+        self.rsu = [(row, index[date], q) for row, date, q in self.rsu]
+        self.espp = [(row, index[date], a, s) for row, date, a, s in self.espp]
+        days = [
+            int(np.busday_count(today.date(), d.date())) for d in self.dates
+        ]
+        self.days = np.diff(np.array([0] + days))
+
+    def _espp_amount(self, name):
+        "Returns the cash withheld for an ESPP buy, see ESPP._withhold()"
+        espp = self.cfg.pay.espp
+        if name == "first":
+            start, end = self.cfg.day(1, 1), espp.date_first
+        else:
+            start, end = espp.date_first, espp.date_second
+        return sum(
+            income.espp
+            for income in self.pay.index("salary").between(start, end)
+        )
+
+    def _prices(self, rng, paths, model, mu, sigma, returns):
+        "Returns a (paths, len(.dates)) array of prices on .dates"
+        np = optional("numpy")
+        steps = np.zeros((paths, len(self.days)))
+        for index, days in enumerate(self.days):
+            if model == "gbm":
+                years = days / _TRADING_DAYS
+                steps[:, index] = (mu - sigma * sigma / 2.0) * years
+                steps[:, index] += (
+                    sigma * sqrt(years) * rng.standard_normal(paths)
+                )
+                continue
+            while days > 0:
+                draw = min(days, _BOOTSTRAP_DAYS)
+                picks = rng.integers(0, len(returns), size=(paths, draw))
+                steps[:, index] += returns[picks].sum(axis=1)
+                days -= draw
+        return np.exp(log(self.price) + np.cumsum(steps, axis=1))
+
+    def _gross(self, prices):
+        "Returns the (paths, rows) gross of every income for prices"
+        np = optional("numpy")
+        gross = np.tile(self.gross, (len(prices), 1))
+        for row, index, quantity in self.rsu:
+            gross[:, row] = quantity * prices[:, index]
+        for row, index, amount, start in self.espp:
+            buy = np.minimum(start, prices[:, index])
+            gross[:, row] = np.floor(amount / buy) * buy
+        return gross
+
+    def _federal(self, gross):
+        """
+        Returns per-path (supplimental gross, federal withholding) totals,
+        see Federal.add()
+        """
+        np = optional("numpy")
+        ytd = federal = np.zeros(len(gross))
+        for row in np.flatnonzero(self.supplimental):
+            amount = gross[:, row]
+            if self.manual[row] > 0.0:
+                federal = federal + amount * self.manual[row]
+            else:
+                low = np.clip(_CAP - ytd, 0.0, amount)
+                federal = federal + low * _PERCENT_LO
+                federal = federal + (amount - low) * _PERCENT_HI
+            ytd = ytd + amount
+        return ytd, federal
+
+    def _fica(self, gross):
+        """
+        Returns per-path (Social Security, Medicare) tax totals, see
+        SocialSecurity.add() and Medicare.add()
+        """
+        np = optional("numpy")
+        medicare, social = self.cfg.medicare, self.cfg.social_security
+        percent_medicare = medicare.percent / 100.0
+        percent_surtax = medicare.surtax_percent / 100.0
+        percent_social = social.percent / 100.0
+        social_max = social.cap * percent_social
+        wages = np.where(self.supplimental, gross, self.wage)
+        ytd_wage = ytd_social = tax_medicare = np.zeros(len(gross))
+        for amount in wages.T:
+            surtax = np.maximum(ytd_wage + amount - medicare.surtax_cap, 0.0)
+            surtax = np.minimum(surtax, amount)
+            ytd_wage = ytd_wage + amount
+            tax_medicare = tax_medicare + amount * percent_medicare
+            tax_medicare = tax_medicare + surtax * percent_surtax
+            ytd_social = np.minimum(
+                ytd_social + amount * percent_social, social_max
+            )
+        return ytd_social, tax_medicare
+
+    def _totals(self, prices):
+        "Returns a dict of name to per-path totals for one chunk of prices"
+        gross = self._gross(prices)
+        supplimental, federal = self._federal(gross)
+        social, medicare = self._fica(gross)
+        return {
+            "price": prices,
+            "rsu": gross[:, [row for row, _, _ in self.rsu]].sum(axis=1),
+            "espp": gross[:, [row for row, _, _, _ in self.espp]].sum(axis=1),
+            "supplimental": supplimental,
+            "federal": federal,
+            "social": social,
+            "medicare": medicare,
+            "net": self.net_fixed + supplimental - federal - social - medicare,
+        }
+
+    def simulate(
+        self, paths, model="gbm", mu=0.0, sigma=0.3, returns=None, seed=None
+    ):
+        """
+        Returns a dict of name to an array of per-path totals for paths
+        simulated price paths. "price" is a (paths, len(.dates)) array.
+        """
+        np = optional("numpy")
+        if model not in MODELS:
+            error(f"invalid Monte Carlo model '{model}'")
+        if model == "bootstrap" and (returns is None or len(returns) == 0):
+            error("bootstrap model requires price history returns")
+        if paths < 1:
+            error(f"invalid Monte Carlo paths {paths}")
+        rng = np.random.default_rng(seed)
+        chunks = []
+        for start in range(0, paths, _CHUNK):
+            count = min(_CHUNK, paths - start)
+            prices = self._prices(rng, count, model, mu, sigma, returns)
+            chunks.append(self._totals(prices))
+        return {
+            name: np.concatenate([chunk[name] for chunk in chunks])
+            for name in chunks[0]
+        }
+
+    def table(self, totals):
+        """
+        Returns the percentile table for simulate() totals as CSV lines:
+        one row per total and per price date, one column per percentile.
+        """
+        np = optional("numpy")
+        titles = [
+            ("rsu", "RSU Gross"),
+            ("espp", "ESPP Gross"),
+            ("supplimental", "Supplimental Gross"),
+            ("federal", "Supplimental Federal Withholding"),
+            ("social", "Social Security Tax"),
+            ("medicare", "Medicare Tax"),
+            ("net", "Net Total"),
+        ]
+        rows = [(title, totals[name]) for name, title in titles]
+        for index, date in enumerate(self.dates):
+            rows.append(
+                (f"Price {date.strftime('%D')}", totals["price"][:, index])
+            )
+        header = ["Total", "Mean"] + [f"P{percent}" for percent in PERCENTILES]
+        lines = [",".join(header)]
+        for title, values in rows:
+            fields = [title, f"{values.mean():.4f}"]
+            for value in np.percentile(values, PERCENTILES):
+                fields.append(f"{value:.4f}")
+            lines.append(",".join(fields))
+        return lines
@@ -0,0 +1,17 @@
+"Optional dependencies, imported on first use"
+
+from functools import cache
+from importlib import import_module
+
+
+@cache
+def optional(name):
+    """
+    Returns module name, or None when it isn't installed. Modules like
+    numpy and pyarrow take longer to load than a quick estimate takes to
+    run, so they're only imported when a caller needs them.
+    """
+    try:
+        return import_module(name)
+    except ImportError:
+        return None
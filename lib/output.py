@@ -0,0 +1,148 @@
+"Streaming report writers"
+
+from array import array
+from datetime import datetime
+from json import dumps as json_dumps
+from sys import stdout
+
+from log import error
+from optional import optional
+from profiler import timed
+
+FORMATS = ("csv", "jsonl", "npz", "arrow")
+
+# Bytes buffered before a write reaches the file.
+_BUFFER = 1 << 16
+
+# Rows per Arrow record batch.
+_BATCH = 4096
+
+
+def suffix(fmt):
+    "Returns the file suffix for output format fmt"
+    return ".arrow" if fmt == "arrow" else f".{fmt}"
+
+
+def write(pay, output="-", fmt="csv"):
+    """
+    Writes the report for pay to output, a path or "-" for stdout, in
+    format fmt:
+      csv   : the estimator CSV, written a line at a time
+      jsonl : one JSON object per income then one with the info
+      npz   : NumPy .npz, one array per Income field plus the info
+      arrow : Arrow IPC file, incomes written in record batches with the
+              info in the schema metadata
+    Rows go out through a buffered writer as they're produced, the report
+    is never held in memory as one string.
+    """
+    if fmt not in FORMATS:
+        error(f"invalid output format '{fmt}'")
+    if fmt == "npz" and optional("numpy") is None:
+        error("npz output requires numpy")
+    if fmt == "arrow" and optional("pyarrow") is None:
+        error("arrow output requires pyarrow")
+    binary = fmt in ("npz", "arrow")
+    if str(output) == "-":
+        stream = stdout.buffer if binary else stdout
+        with timed("output"):
+            _WRITERS[fmt](pay, stream)
+            stream.flush()
+        return
+    mode = "wb" if binary else "w"
+    encoding = None if binary else "utf-8"
+    # pylint: disable=unspecified-encoding
+    with open(output, mode, buffering=_BUFFER, encoding=encoding) as stream:
+        with timed("output"):
+            _WRITERS[fmt](pay, stream)
+
+
+def _csv(pay, stream):
+    for line in pay.lines():
+        stream.write(line)
+        stream.write("\n")
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    return value
+
+
+def _jsonl(pay, stream):
+    attrs = pay.fields
+    for income in pay.incomes():
+        row = {attr: _json_value(getattr(income, attr)) for attr in attrs}
+        stream.write(json_dumps(row, separators=(",", ":")))
+        stream.write("\n")
+    info = {key: _json_value(value) for key, value in pay.summary()}
+    stream.write(
+        json_dumps({"info": info}, separators=(",", ":"), default=str)
+    )
+    stream.write("\n")
+
+
+def _columns(attrs, incomes):
+    "Returns a dict of attr to column for an iterable of incomes"
+    columns = {}
+    for attr in attrs:
+        columns[attr] = [] if attr in ("date", "kind") else array("d")
+    for income in incomes:
+        for attr in attrs:
+            columns[attr].append(getattr(income, attr))
+    return columns
+
+
+def _npz(pay, stream):
+    np = optional("numpy")
+    columns = _columns(pay.fields, pay.incomes())
+    arrays = {}
+    for attr, column in columns.items():
+        if attr == "date":
+            dates = [_json_value(value) for value in column]
+            arrays[attr] = np.array(dates, dtype="datetime64[D]")
+        elif attr == "kind":
+            arrays[attr] = np.array(column, dtype=str)
+        else:
+            arrays[attr] = np.frombuffer(column, dtype=float)
+    summary = pay.summary()
+    arrays["info_key"] = np.array([key for key, _ in summary], dtype=str)
+    arrays["info_value"] = np.array(
+        [str(value) for _, value in summary], dtype=str
+    )
+    np.savez_compressed(stream, **arrays)
+
+
+def _arrow_batch(schema, rows):
+    pa = optional("pyarrow")
+    columns = _columns(schema.names, rows)
+    arrays = [
+        pa.array(columns[attr], schema.field(attr).type)
+        for attr in schema.names
+    ]
+    return pa.record_batch(arrays, schema=schema)
+
+
+def _arrow(pay, stream):
+    pa = optional("pyarrow")
+    fields = []
+    for attr in pay.fields:
+        if attr == "date":
+            fields.append(pa.field(attr, pa.timestamp("s")))
+        elif attr == "kind":
+            fields.append(pa.field(attr, pa.string()))
+        else:
+            fields.append(pa.field(attr, pa.float64()))
+    metadata = {key: str(value) for key, value in pay.summary()}
+    schema = pa.schema(fields, metadata=metadata)
+    with pa.ipc.new_file(stream, schema) as writer:
+        rows = []
+        for income in pay.incomes():
+            rows.append(income)
+            if len(rows) == _BATCH:
+                writer.write_batch(_arrow_batch(schema, rows))
+                rows = []
+        if rows:
+            writer.write_batch(_arrow_batch(schema, rows))
+
+
+_WRITERS = {"csv": _csv, "jsonl": _jsonl, "npz": _npz, "arrow": _arrow}
@@ -1,46 +1,441 @@
 "Pay income generator, where everything merges and finalizes."
 
+from array import array
+from collections import namedtuple
+from copy import copy
+from heapq import merge
+from itertools import repeat
+from operator import add, attrgetter, sub
 from pathlib import Path
 
+from dateindex import DateIndex
+from engine import ENGINES, Engine
 from espp import ESPP
 from federal import Federal
 from git import repo_version
-from log import info, error, verbose_level
+from income import Income, projection, quote
+from ledger import Ledger
+from log import error, info, verbose_level
 from medicare import Medicare
+from profiler import timed
 from salary import Salary
 from savings import Savings
 from social_security import SocialSecurity
 
 _BASE = Path(__file__).parent.resolve()
+_DATE = attrgetter("date")
+
+
+Stage = namedtuple("Stage", "name config reads writes")
+
+# The Pay pipeline as a stage graph in run order. Each stage lists the
+# config fields (dotted paths) and Income fields it reads and the Income
+# fields it writes: "base" stands for the salary, supplimental and RSU
+# incomes and "rows" for the final list of incomes itself. A stage re-runs
+# when a config field it reads changes or when an earlier stage it reads
+# from re-runs, see Pay.recompute(), and only runs at all when a column the
+# caller asked for depends on it, see needed().
+_DEDUCTIONS = ("fsa", "hsa", "medical", "dental", "vision", "vacation_buy")
+STAGES = (
+    Stage(
+        "salary",
+        config=(
+            "year",
+            "country",
+            "pay.gross",
+            "pay.increase",
+            "pay.term_life",
+            "federal.personal_exemption",
+            "income",
+            "rsu_price",
+        )
+        + tuple(f"pay.{attr}" for attr in _DEDUCTIONS),
+        reads=(),
+        writes=("base", "personal_exemption", "term_life") + _DEDUCTIONS,
+    ),
+    Stage(
+        "espp",
+        config=("pay.espp", "rsu_url"),
+        reads=("base", "gross"),
+        writes=("rows", "percent_espp", "espp", "ytd_espp"),
+    ),
+    Stage(
+        "ytd_gross",
+        config=("pay.withhold",),
+        reads=("rows", "gross", "rsu_quantity"),
+        writes=(
+            "withhold",
+            "ytd_gross",
+            "ytd_gross_supplimental",
+            "ytd_gross_total",
+            "ytd_withhold",
+            "ytd_rsu_quantity_remaining",
+            "ytd_rsu_quantity_vested",
+        ),
+    ),
+    Stage(
+        "savings",
+        config=("save", "pay.increase"),
+        reads=("rows", "gross"),
+        writes=(
+            "percent_401k",
+            "contrib_401k",
+            "contrib_401k_match",
+            "percent_401k_post",
+            "contrib_401k_post",
+            "ytd_401k",
+            "ytd_401k_match",
+            "ytd_401k_post",
+            "ytd_401k_total",
+        ),
+    ),
+    Stage(
+        "deductions",
+        config=(),
+        reads=("rows", "gross", "contrib_401k", "term_life") + _DEDUCTIONS,
+        writes=("deductions", "federal_taxable", "ytd_term_life")
+        + tuple(f"ytd_{attr}" for attr in _DEDUCTIONS),
+    ),
+    Stage(
+        "federal",
+        config=("federal",),
+        reads=("rows", "gross", "federal_taxable", "personal_exemption"),
+        writes=("tax_federal", "percent_tax_federal", "ytd_tax_federal"),
+    ),
+    Stage(
+        "medicare",
+        config=("medicare", "pay.term_life"),
+        reads=("rows", "gross") + _DEDUCTIONS,
+        writes=(
+            "tax_medicare",
+            "tax_medicare_surtax",
+            "ytd_tax_medicare",
+            "ytd_tax_medicare_surtax",
+            "ytd_tax_medicare_total",
+        ),
+    ),
+    Stage(
+        "social_security",
+        config=("social_security", "pay.term_life"),
+        reads=("rows", "gross") + _DEDUCTIONS,
+        writes=("tax_social", "ytd_tax_social"),
+    ),
+    Stage(
+        "net",
+        config=("pay.start_net_fudge",),
+        reads=(
+            "rows",
+            "gross",
+            "contrib_401k",
+            "contrib_401k_post",
+            "tax_federal",
+            "tax_social",
+            "tax_medicare",
+            "tax_medicare_surtax",
+            "withhold",
+            "espp",
+        )
+        + _DEDUCTIONS,
+        writes=(
+            "net",
+            "tax_medicare_total",
+            "ytd_net",
+            "ytd_net_supplimental",
+            "ytd_net_total",
+        ),
+    ),
+)
+
+# Stages the fused engine computes in its single pass.
+_FUSED = frozenset(
+    (
+        "ytd_gross",
+        "deductions",
+        "federal",
+        "medicare",
+        "social_security",
+        "net",
+    )
+)
+
+
+# (Income YTD attribute, summary title) for the year-end totals.
+TOTALS = (
+    ("ytd_gross_total", "Gross Total"),
+    ("ytd_net_total", "Net Total"),
+    ("ytd_401k", "401(k) Pre-tax"),
+    ("ytd_401k_post", "401(k) Post-tax"),
+    ("ytd_401k_match", "401(k) Match"),
+    ("ytd_tax_federal", "Federal Tax"),
+    ("ytd_tax_social", "Social Security Tax"),
+    ("ytd_tax_medicare_total", "Medicare Tax"),
+    ("ytd_espp", "ESPP"),
+)
+
+
+def totals(income_list):
+    "Returns the year-end TOTALS of a finished list of incomes"
+    # YTD values never shrink and some are only set on salary incomes, so
+    # the year-end total is the largest one.
+    return tuple(
+        max((getattr(income, attr) for income in income_list), default=0.0)
+        for attr, _ in TOTALS
+    )
+
+
+def _matches(path, field):
+    "Returns True if dotted config path and field overlap"
+    return (
+        path == field
+        or field.startswith(f"{path}.")
+        or path.startswith(f"{field}.")
+    )
+
+
+def dirty(paths):
+    """
+    Returns the names of the stages to re-run, in run order, when the
+    dotted config paths change.
+    """
+    names, written = [], set()
+    for stage in STAGES:
+        changed = any(
+            _matches(path, field) for path in paths for field in stage.config
+        )
+        if changed or written.intersection(stage.reads):
+            names.append(stage.name)
+            written.update(stage.writes)
+    return names
+
+
+def assemble(*streams):
+    """
+    Returns one list of incomes in pay order from streams of incomes each
+    already in date order. Incomes paid the same day keep the order of
+    their streams, then their order within a stream, as sorting the
+    concatenated streams would.
+    """
+    return list(merge(*streams, key=_DATE))
+
+
+def needed(fields):
+    """
+    Returns the names of the stages, in run order, that produce the Income
+    fields (or "base" and "rows"). The salary stage always runs.
+    """
+    names, wanted = [], set(fields)
+    for stage in reversed(STAGES):
+        if stage.name == "salary" or wanted.intersection(stage.writes):
+            names.append(stage.name)
+            wanted.update(stage.reads)
+    return names[::-1]
 
 
 class Pay:
-    "Pay income generator, where everything merges and finalizes."
+    """
+    Pay income generator, where everything merges and finalizes.
 
-    def __init__(self, cfg, log_level):
+    The work is split into the STAGES graph. After changing the config,
+    .recompute() (or .update()) re-runs only the stages the change reaches:
+    a new withhold() entry re-runs ytd_gross and net, never the 401(k)
+    optimizer.
+
+    With a ResultCache a finished estimate for the same inputs is used
+    instead of running any stage, and new full estimates are stored.
+
+    columns limits the report to those Income fields and runs only the
+    stages they need. An empty columns only runs the salary stage, enough
+    for .pay_periods().
+    """
+
+    def __init__(
+        self,
+        cfg,
+        log_level,
+        columnar=False,
+        engine="staged",
+        columns=None,
+        cache=None,
+    ):
         verbose_level(log_level)
         info(cfg, level=2)
+        if engine not in ENGINES:
+            error(f"invalid engine '{engine}'")
         self.cfg = cfg
-        self.income = sorted(
-            list(Salary(cfg)) + cfg.income.supplimental + cfg.income.rsu
+        self.columnar = columnar
+        self.engine = engine
+        self.income = self._base = self.manual = []
+        self._manual = {}
+        self._indexes = {}  # kind: (.income indexed, DateIndex)
+        self.cached = False
+        if columns is None:
+            self.fields = Income.__slots__
+            self.header, self._values = Income.HEADER, Income.csv_values
+            self.stages = [stage.name for stage in STAGES]
+        else:
+            self.fields = tuple(columns)
+            self.header, self._values = projection(self.fields)
+            self.stages = self._plan(self.fields)
+        with timed("cache"):
+            key = None if cache is None else cache.key(cfg, engine)
+            income_list = None if key is None else cache.get(key)
+        if income_list is not None:
+            self._restore(income_list)
+            return
+        self._run(self.stages)
+        if key is not None and columns is None:
+            with timed("cache"):
+                # A fetched stock price is part of the key, look it up again.
+                cache.put(cache.key(cfg, engine), self.income)
+
+    def _restore(self, income_list):
+        "Uses a finished list of incomes from a ResultCache"
+        self.cached = True
+        self._base = income_list
+        self.income = Ledger(income_list) if self.columnar else income_list
+
+    def _plan(self, columns):
+        "Returns the stages needed for columns, see needed()"
+        fields = ("rows",) + columns if columns else ()
+        names = needed(fields)
+        if self.engine == "fused" and _FUSED.intersection(names):
+            # The fused engine computes all of its stages in one pass.
+            for stage in STAGES:
+                if stage.name in _FUSED:
+                    fields += stage.writes
+            names = needed(fields)
+        return names
+
+    def recompute(self, *paths):
+        """
+        Re-runs the stages reached by changes to the dotted config paths,
+        e.g. "pay.withhold" after a cfg.withhold() call. Returns the names
+        of the stages that ran.
+        """
+        names = [name for name in dirty(paths) if name in self.stages]
+        if self.cached:
+            names, self.cached = self.stages, False  # No stage has run
+        self._run(names)
+        return names
+
+    def update(self, overrides):
+        """
+        Sets dotted config paths to new values, see Config.override(), and
+        re-runs the stages they reach. Returns the names of the stages that
+        ran.
+        """
+        self.cfg.override(overrides)
+        return self.recompute(*overrides)
+
+    def _run(self, names):
+        fused = self.engine == "fused" and _FUSED.intersection(names)
+        for name in names:
+            if fused and name in _FUSED:
+                continue
+            with timed(name):
+                getattr(self, f"_stage_{name}")()
+        if fused:
+            with timed("fused"):
+                self._withhold()
+                self._restore_manual()
+                Engine(self.cfg).run(self.income)
+
+    def _stage_salary(self):
+        if self.columnar:
+            self._stage_salary_columns()
+            return
+        # Stages write to every income, work on copies of the config's.
+        supplimental = [copy(inc) for inc in self.cfg.income.supplimental]
+        rsu = [copy(inc) for inc in self.cfg.income.rsu]
+        self._manual = {
+            id(inc): inc.percent_tax_federal for inc in supplimental + rsu
+        }
+        self._base = assemble(
+            Salary(self.cfg),
+            sorted(supplimental, key=_DATE),
+            sorted(rsu, key=_DATE),
         )
-        espp_obj = ESPP(cfg, self.income)
-        self.income.extend(espp_obj.buys())
-        self.income.sort()
+
+    def _stage_salary_columns(self):
+        "Column version of ._stage_salary(), no config income is copied"
+        incomes = assemble(
+            sorted(self.cfg.income.supplimental, key=_DATE),
+            sorted(self.cfg.income.rsu, key=_DATE),
+        )
+        self._base = Salary(self.cfg).ledger().merged(incomes)
+
+    def _stage_espp(self):
+        if self.columnar:
+            self._stage_espp_columns()
+            return
+        for income in self._base:
+            income.percent_espp = income.espp = income.ytd_espp = 0.0
+        espp_obj = ESPP(self.cfg, self._base)
+        self.income = assemble(self._base, sorted(espp_obj.buys(), key=_DATE))
         # ^^^ Update for ESPP before calculating YTD values
+        self.manual = [self._manual.get(id(inc), 0.0) for inc in self.income]
+        # ^^^ Federal overwrites manual percents, keep them for re-runs
+
+    def _stage_espp_columns(self):
+        "Column version of ._stage_espp()"
+        for attr in "percent_espp", "espp", "ytd_espp":
+            self._base.set_column(attr, repeat(0.0, len(self._base)))
+        espp_obj = ESPP(self.cfg, self._base)
+        self.income = self._base.merged(sorted(espp_obj.buys(), key=_DATE))
+        # Later stages only write to .income, the base keeps the manual
+        # percents of the config's incomes.
+        self.manual = list(self.income.column("percent_tax_federal"))
+
+    def _stage_ytd_gross(self):
+        self._withhold()
         self._ytd_gross()
         # ^^^ Creates several YTD values for income
-        Savings(cfg, self.income)
+
+    def _stage_savings(self):
+        Savings(self.cfg, self.income, ytd=self.engine != "fused")
         # ^^^ Federal deductions must come AFTER 401(k) calculations
+
+    def _stage_deductions(self):
         self._federal_deductions()
         # ^^^ Pre-tax deductions must come BEFORE tax calculations
-        Federal(cfg, self.income)
-        Medicare(cfg, self.income)
-        SocialSecurity(cfg, self.income)
+
+    def _stage_federal(self):
+        self._restore_manual()
+        Federal(self.cfg, self.income)
+
+    def _stage_medicare(self):
+        Medicare(self.cfg, self.income)
+
+    def _stage_social_security(self):
+        SocialSecurity(self.cfg, self.income)
         # ^^^ Tax calculations must come BEFORE net pay calculations
+
+    def _stage_net(self):
         self._net()
 
+    def _withhold(self):
+        if isinstance(self.income, Ledger):
+            kind, date = self.income.column("kind"), self.income.column("date")
+            withhold = self.income.column("withhold")
+            for index, value in enumerate(kind):
+                if value == "salary":
+                    withhold[index] = self.cfg.withhold_amount(date[index])
+            return
+        for income in self.income:
+            if income.kind == "salary":
+                income.withhold = self.cfg.withhold_amount(income.date)
+
+    def _restore_manual(self):
+        if isinstance(self.income, Ledger):
+            self.income.set_column("percent_tax_federal", self.manual)
+            return
+        for income, percent in zip(self.income, self.manual):
+            income.percent_tax_federal = percent
+
     def _ytd_gross(self):
+        if isinstance(self.income, Ledger):
+            self._ytd_gross_columns()
+            return
         ytd_rsu_quantity_remaining = ytd_rsu_quantity_vested = 0.0
         for income in self.income:
             if income.kind == "rsu":
@@ -62,7 +457,47 @@ class Pay:
             income.ytd_rsu_quantity_remaining = ytd_rsu_quantity_remaining
             income.ytd_rsu_quantity_vested = ytd_rsu_quantity_vested
 
+    def _ytd_gross_columns(self):
+        "Column version of ._ytd_gross() for a Ledger"
+        # pylint: disable=too-many-locals
+        col = self.income.column
+        kind, gross, quantity = col("kind"), col("gross"), col("rsu_quantity")
+        withhold = col("withhold")
+        ytd_gross_col, ytd_supplimental_col, ytd_total_col = (
+            col("ytd_gross"),
+            col("ytd_gross_supplimental"),
+            col("ytd_gross_total"),
+        )
+        ytd_withhold_col, remaining_col, vested_col = (
+            col("ytd_withhold"),
+            col("ytd_rsu_quantity_remaining"),
+            col("ytd_rsu_quantity_vested"),
+        )
+        remaining = vested = 0.0
+        for index, value in enumerate(kind):
+            if value == "rsu":
+                remaining += quantity[index]
+        ytd_gross = ytd_gross_supplimental = ytd_withhold = 0.0
+        for index, value in enumerate(kind):
+            if value == "salary":
+                ytd_gross += gross[index]
+                ytd_withhold += withhold[index]
+            else:
+                if value == "rsu":
+                    remaining -= quantity[index]
+                    vested += quantity[index]
+                ytd_gross_supplimental += gross[index]
+            ytd_gross_col[index] = ytd_gross
+            ytd_supplimental_col[index] = ytd_gross_supplimental
+            ytd_total_col[index] = ytd_gross + ytd_gross_supplimental
+            ytd_withhold_col[index] = ytd_withhold
+            remaining_col[index] = remaining
+            vested_col[index] = vested
+
     def _federal_deductions(self):
+        if isinstance(self.income, Ledger):
+            self._federal_deductions_columns()
+            return
         ytd = {
             "ytd_term_life": 0.0,
             "ytd_fsa": 0.0,
@@ -86,7 +521,40 @@ class Pay:
                 ytd[ytd_attr] += getattr(income, attr)
                 setattr(income, ytd_attr, ytd[ytd_attr])
 
+    def _federal_deductions_columns(self):
+        "Column version of ._federal_deductions() for a Ledger"
+        ledger = self.income
+        deductions = ledger.column("contrib_401k")
+        for attr in (
+            "fsa",
+            "hsa",
+            "medical",
+            "dental",
+            "vision",
+            "vacation_buy",
+        ):
+            deductions = map(add, deductions, ledger.column(attr))
+        deductions = array("d", deductions)
+        ledger.set_column("deductions", deductions)
+        ledger.set_column(
+            "federal_taxable",
+            map(sub, ledger.column("gross"), deductions),
+        )
+        for attr in (
+            "term_life",
+            "fsa",
+            "hsa",
+            "medical",
+            "dental",
+            "vision",
+            "vacation_buy",
+        ):
+            ledger.cumulative(attr, f"ytd_{attr}")
+
     def _net(self):
+        if isinstance(self.income, Ledger):
+            self._net_columns()
+            return
         ytd_net = ytd_net_supplimental = 0.0
         fudge = self.cfg.pay.start_net_fudge
         for income in self.income:
@@ -102,50 +570,135 @@ class Pay:
             income.ytd_net_supplimental = ytd_net_supplimental
             income.ytd_net_total = ytd_net + ytd_net_supplimental
 
+    def _net_columns(self):
+        "Column version of ._net() for a Ledger, see Income.calc_net()"
+        ledger = self.income
+        col = ledger.column
+        ledger.set_column(
+            "tax_medicare_total",
+            map(add, col("tax_medicare"), col("tax_medicare_surtax")),
+        )
+        net = col("gross")
+        for attr in (
+            "contrib_401k",
+            "contrib_401k_post",
+            "tax_federal",
+            "tax_social",
+            "tax_medicare_total",
+            "fsa",
+            "hsa",
+            "medical",
+            "dental",
+            "vision",
+            "vacation_buy",
+            "withhold",
+            "espp",
+        ):
+            net = map(sub, net, col(attr))
+        ledger.set_column("net", net)
+        ledger.validate()
+        net, kind = col("net"), col("kind")
+        ytd_net_col, ytd_supplimental_col, ytd_total_col = (
+            col("ytd_net"),
+            col("ytd_net_supplimental"),
+            col("ytd_net_total"),
+        )
+        ytd_net = ytd_net_supplimental = 0.0
+        fudge = self.cfg.pay.start_net_fudge
+        for index, value in enumerate(kind):
+            if value == "salary":
+                if isinstance(fudge, float):
+                    net[index] += fudge
+                    fudge = None
+                ytd_net += net[index]
+            else:
+                ytd_net_supplimental += net[index]
+            ytd_net_col[index] = ytd_net
+            ytd_supplimental_col[index] = ytd_net_supplimental
+            ytd_total_col[index] = ytd_net + ytd_net_supplimental
+
     def pay_periods(self):
         "Returns a list of string pay periods (salary)"
         periods = []
-        for income in self.income:
+        for income in self._base:
             if income.kind == "salary":
                 periods.append(income.date.strftime("%D"))
         return periods
 
-    def csv(self):
-        "Returns an array of strings to use as the final CSV"
-        lines = []
+    def index(self, kind=None):
+        """
+        Returns a DateIndex over the incomes, only those of kind when set.
+        It's rebuilt when a stage re-run replaces .income.
+        """
+        income, index = self._indexes.get(kind, (None, None))
+        if income is not self.income:
+            items = self.income
+            if kind is not None:
+                items = [inc for inc in self.income if inc.kind == kind]
+            index = DateIndex(items)
+            self._indexes[kind] = self.income, index
+        return index
+
+    def paycheck(self, date):
+        "Returns the last salary paycheck on or before date or None"
+        return self.index("salary").on_or_before(date)
+
+    def incomes(self):
+        "Yields every finalized income in pay order"
         for income in self.income:
             info(income, level=1)
-            header, values = income.csv()
-            if not lines:
-                lines.append(header)
-            if header != lines[0]:
-                diff = set(lines[0].split(","))
-                diff = diff.symmetric_difference(set(header.split(",")))
-                error(f"CSV header mismatch, difference={diff}")
-            lines.append(values)
+            yield income
+
+    def lines(self):
+        """
+        Yields the full CSV report one line at a time: income rows, a blank
+        line, then info
+        """
+        if self.income:
+            yield self.header
+        for income in self.incomes():
+            yield self._values(income)
+        yield ""
+        yield from self.csv_info()
+
+    def csv(self):
+        "Returns an array of strings to use as the final CSV"
+        lines = [self.header] if self.income else []
+        for income in self.incomes():
+            lines.append(self._values(income))
         return lines
 
-    def csv_info(self):
-        "Returns info as an array of CSV strings"
+    def report(self):
+        "Returns the full CSV report: income rows, a blank line, then info"
+        return list(self.lines())
+
+    def summary(self):
+        "Returns info as a list of (key, value) pairs"
         version = repo_version(_BASE)
         save = self.cfg.save
         manual_pre = bool(save.percent_pre.manual)
         manual_post = bool(save.percent_post.manual)
         increase_start = self.cfg.pay.increase.start_date.strftime("%D")
         return [
-            "Estimator key,Value",
-            f"Created,{self.cfg.today().strftime('%D')}",
-            f"Version,{version}",
-            f"Year,{self.cfg.year}",
-            f"Salary increase percent,{self.cfg.pay.increase.percent}",
-            f"Salary increase start,{increase_start}",
-            f"401(k) pre-tax cap,{save.cap_pre}",
-            f"401(k) total cap,{save.cap}",
-            f"401(k) pre-tax start percent,{save.percent_pre.start}",
-            f"401(k) pre-tax increase percent,{save.percent_pre.increase}",
-            f"401(k) pre-tax manual mode,{manual_pre}",
-            f"401(k) post-tax start percent,{save.percent_post.start}",
-            f"401(k) post-tax increase percent,{save.percent_post.increase}",
-            f"401(k) post-tax manual mode,{manual_post}",
-            f"CFG version,{self.cfg.version}",
+            ("Created", self.cfg.today().strftime("%D")),
+            ("Version", version),
+            ("Year", self.cfg.year),
+            ("Salary increase percent", self.cfg.pay.increase.percent),
+            ("Salary increase start", increase_start),
+            ("401(k) pre-tax cap", save.cap_pre),
+            ("401(k) total cap", save.cap),
+            ("401(k) pre-tax start percent", save.percent_pre.start),
+            ("401(k) pre-tax increase percent", save.percent_pre.increase),
+            ("401(k) pre-tax manual mode", manual_pre),
+            ("401(k) post-tax start percent", save.percent_post.start),
+            ("401(k) post-tax increase percent", save.percent_post.increase),
+            ("401(k) post-tax manual mode", manual_post),
+            ("CFG version", self.cfg.version),
         ]
+
+    def csv_info(self):
+        "Returns info as an array of CSV strings"
+        lines = ["Estimator key,Value"]
+        for key, value in self.summary():
+            lines.append(f"{key},{quote(str(value))}")
+        return lines
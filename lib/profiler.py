@@ -0,0 +1,136 @@
+"Stage timing, memory and event counts for a run"
+
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from json import dumps as json_dumps
+from threading import Lock
+from time import perf_counter
+import tracemalloc
+
+# The Profile being recorded, None when profiling is off.
+_ACTIVE = None
+_NULL = nullcontext()
+
+# Table row layouts, see Profile.table().
+_ROW = "{:<16} {:>6} {:>10} {:>6} {:>10}"
+_COUNTER = "{:<28} {:>10}"
+
+
+def count(name, amount=1):
+    "Adds amount to the name event counter while profiling"
+    if _ACTIVE is not None:
+        _ACTIVE.add(name, amount)
+
+
+def timed(name):
+    """
+    Returns a context manager that records the wall time, call and peak
+    traced memory of a named stage while profiling, one that does nothing
+    otherwise. Stages don't nest.
+    """
+    if _ACTIVE is None:
+        return _NULL
+    return _ACTIVE.timed(name)
+
+
+class Profile:
+    """
+    Records timed() stages and count() events while active:
+
+      with Profile() as profile:
+          pay = Pay(cfg, 0)
+          write(pay, "out.csv")
+      print("\\n".join(profile.table()))
+
+    With memory each stage also records its tracemalloc peak, the most
+    memory it allocated at once. Tracing slows the run down, the stage
+    times are still comparable to each other.
+    """
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.seconds = 0.0
+        self.stages = {}  # name: {"calls", "seconds", "peak_bytes"}
+        self.counters = Counter()
+        self._lock = Lock()  # HTTP fetches count from worker threads
+        self._tracing = False
+        self._start = None
+
+    def __enter__(self):
+        global _ACTIVE  # pylint: disable=global-statement
+        _ACTIVE = self
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        global _ACTIVE  # pylint: disable=global-statement
+        self.seconds += perf_counter() - self._start
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        _ACTIVE = None
+
+    def add(self, name, amount=1):
+        "Adds amount to the name event counter"
+        with self._lock:
+            self.counters[name] += amount
+
+    @contextmanager
+    def timed(self, name):
+        "Records one call of stage name, see timed()"
+        tracing, base = tracemalloc.is_tracing(), 0
+        if tracing:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            seconds = perf_counter() - start
+            peak = 0
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1] - base
+            entry = self.stages.setdefault(
+                name, {"calls": 0, "seconds": 0.0, "peak_bytes": 0}
+            )
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["peak_bytes"] = max(entry["peak_bytes"], peak)
+
+    def data(self):
+        "Returns the profile as a dict of JSON values"
+        return {
+            "seconds": self.seconds,
+            "stages": {
+                name: dict(entry) for name, entry in self.stages.items()
+            },
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def json(self):
+        "Returns the profile as a JSON string"
+        return json_dumps(self.data(), indent=2)
+
+    def table(self):
+        "Returns the profile as lines of a human readable table"
+        lines = [_ROW.format("Stage", "Calls", "Seconds", "%", "Peak KiB")]
+        for name, entry in self.stages.items():
+            share = entry["seconds"] / self.seconds if self.seconds else 0.0
+            lines.append(
+                _ROW.format(
+                    name,
+                    entry["calls"],
+                    f"{entry['seconds']:.4f}",
+                    f"{100.0 * share:.1f}",
+                    f"{entry['peak_bytes'] / 1024:.1f}",
+                )
+            )
+        lines.append(_ROW.format("total", "", f"{self.seconds:.4f}", "", ""))
+        if self.counters:
+            lines += ["", _COUNTER.format("Counter", "Count")]
+            for name, value in sorted(self.counters.items()):
+                lines.append(_COUNTER.format(name, value))
+        return lines
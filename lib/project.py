@@ -0,0 +1,126 @@
+"Multi-year projections that carry balances from one year to the next"
+
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+# pylint takes config for the repo's config/ directory, not lib/config.py.
+# pylint: disable=wrong-import-order
+from cache import ResultCache
+from config import load
+from log import ErrorExit, verbose_level
+from output import write
+from pay import Pay, totals
+
+# pylint: enable=wrong-import-order
+
+
+def configure(filename, offset, balances=None, today=None):
+    """
+    Returns the Config of filename offset years ahead with the carried()
+    balances of the year before applied. Every date the config makes moves
+    with the year, so this year's RSU vests and supplimental incomes repeat
+    on the same days (February 29 on the 28th outside leap years), RSU
+    vests up to the carried unvested quantity.
+    """
+    balances = dict(balances or {})
+    unvested = balances.pop("income.rsu_unvested", None)
+    cfg = load(filename)(filename, balances, today, offset)
+    if offset and unvested is not None:
+        left = unvested
+        for income in sorted(cfg.income.rsu):
+            income.rsu_quantity = min(income.rsu_quantity, left)
+            income.gross = income.rsu_quantity * income.rsu_vest_price
+            left -= income.rsu_quantity
+        cfg.income.rsu = [inc for inc in cfg.income.rsu if inc.rsu_quantity]
+        cfg.income.rsu_unvested = left
+    return cfg
+
+
+def carried(cfg, income_list):
+    """
+    Returns the overrides the next year starts from after cfg's year with
+    its incomes: salary after the increase, the ESPP cash withheld after
+    the second buy (next year's carryover) and the RSU quantity still
+    unvested.
+    """
+    espp = cfg.pay.espp
+    result = {
+        "pay.gross": cfg.pay.gross * (1.0 + cfg.pay.increase.percent / 100.0),
+        "pay.espp.carryover": sum(
+            income.espp
+            for income in income_list
+            if income.kind == "salary" and income.date > espp.date_second
+        ),
+    }
+    if cfg.income.rsu_unvested is not None:
+        result["income.rsu_unvested"] = cfg.income.rsu_unvested
+    return result
+
+
+def chain(filename, years, today=None, log_level=0):
+    """
+    Returns a list of carried overrides, one per year. Each year only runs
+    the Pay stages the next year depends on (salary and ESPP) so every
+    year's full estimate can run independently afterwards.
+    """
+    chained = [{}]
+    for offset in range(years - 1):
+        cfg = configure(filename, offset, chained[-1], today)
+        pay = Pay(cfg, log_level, columns=("espp",))
+        chained.append(carried(cfg, pay.income))
+    return chained
+
+
+def estimate(filename, offset, overrides, options):
+    """
+    Worker: estimates one year of a projection and writes its report when
+    options has an output. Returns (year, totals, message, seconds), totals
+    is None and message the reason when the year doesn't estimate.
+    """
+    start, year = perf_counter(), None
+    try:
+        verbose_level(options["log_level"])
+        cfg = configure(filename, offset, overrides, options["today"])
+        year = cfg.year
+        cache = ResultCache() if options["cache"] else None
+        pay = Pay(cfg, options["log_level"], cache=cache)
+        if options["output"] is not None:
+            output = options["output"] / f"{year}{options['suffix']}"
+            write(pay, output, options["format"])
+        return year, totals(pay.income), "", perf_counter() - start
+    except ErrorExit as exc:
+        message = exc.msg
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        message = f"{type(exc).__name__}: {exc}"
+    return year, None, message, perf_counter() - start
+
+
+def project(filename, years, jobs=1, options=None):
+    """
+    Projects filename's config over years, yielding estimate() results in
+    year order. Balances are chained year to year first, then the years
+    are estimated across a pool of jobs processes.
+    """
+    options = dict(options or {})
+    for name, default in (
+        ("log_level", 0),
+        ("today", None),
+        ("cache", True),
+        ("output", None),
+        ("format", "csv"),
+        ("suffix", ".csv"),
+    ):
+        options.setdefault(name, default)
+    chained = chain(filename, years, options["today"], options["log_level"])
+    if jobs == 1 or years < 2:
+        for offset, overrides in enumerate(chained):
+            yield estimate(filename, offset, overrides, options)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(
+            estimate,
+            [filename] * years,
+            range(years),
+            chained,
+            [options] * years,
+        )
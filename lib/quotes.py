@@ -0,0 +1,170 @@
+"Fetch stock prices from online quote pages"
+
+from codecs import getincrementaldecoder
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from threading import Lock
+from time import sleep
+from urllib.parse import urljoin, urlsplit
+
+from log import ErrorExit, error
+from profiler import count
+
+_TIMEOUT = 10.0  # Seconds for a connect or any one read
+_RETRIES = 3  # Extra attempts after a network error or busy server
+_BACKOFF = 0.5  # Seconds before the first retry, doubled after each
+_WORKERS = 8  # Quote pages fetched at once
+_CHUNK = 1 << 13  # Bytes read from a page before parsing them
+_REDIRECTS = 5
+_REDIRECT_STATUS = frozenset((301, 302, 303, 307, 308))
+_RETRY_STATUS = frozenset((429, 500, 502, 503, 504))
+
+
+class _Parser(HTMLParser):
+    "Supports Stock class in parsing online HTML for a stock url."
+
+    def __init__(self):
+        super().__init__()
+        self._last_price = None
+
+    def handle_starttag(self, tag, attrs):
+        "finds div attr data-last-price"
+        if self._last_price is not None:
+            return
+        if tag == "div":
+            for key, value in attrs:
+                if key == "data-last-price":
+                    self._last_price = float(value)
+                    return
+
+    def last_price(self):
+        "Returns the last price or None if not found"
+        return self._last_price
+
+
+class _Busy(HTTPException):
+    "A status worth retrying, the server is busy or failing"
+
+
+class Fetcher:
+    """
+    Fetches prices from quote pages. Connections are kept open per host
+    and reused, every connect and read has a timeout and network errors or
+    busy servers are retried with exponential backoff. Pages are parsed as
+    they arrive and the download stops once the price is found.
+    """
+
+    def __init__(
+        self,
+        timeout=_TIMEOUT,
+        retries=_RETRIES,
+        backoff=_BACKOFF,
+        workers=_WORKERS,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.workers = workers
+        self._idle = {}  # (scheme, host) to open connections not in use
+        self._lock = Lock()
+
+    def _acquire(self, scheme, host):
+        with self._lock:
+            idle = self._idle.get((scheme, host))
+            if idle:
+                count("http connection reused")
+                return idle.pop()
+        count("http connection opened")
+        if scheme == "https":
+            return HTTPSConnection(host, timeout=self.timeout)
+        if scheme != "http":
+            error(f"unsupported stock url scheme '{scheme}'")
+        return HTTPConnection(host, timeout=self.timeout)
+
+    def _release(self, scheme, host, conn):
+        with self._lock:
+            self._idle.setdefault((scheme, host), []).append(conn)
+
+    def _parse(self, response):
+        "Returns the price in response, reading only as much as needed"
+        parser = _Parser()
+        decoder = getincrementaldecoder("utf-8")(errors="replace")
+        while parser.last_price() is None:
+            chunk = response.read1(_CHUNK)
+            if not chunk:
+                break
+            parser.feed(decoder.decode(chunk))
+        return parser.last_price()
+
+    def _get(self, url):
+        "Returns the price on the page at url or None, one attempt"
+        for _ in range(_REDIRECTS + 1):
+            parts = urlsplit(url)
+            path = parts.path or "/"
+            if parts.query:
+                path += f"?{parts.query}"
+            conn = self._acquire(parts.scheme, parts.netloc)
+            price = None
+            try:
+                count("http request")
+                conn.request("GET", path, headers={"Accept": "text/html"})
+                response = conn.getresponse()
+                if response.status in _REDIRECT_STATUS:
+                    response.read()
+                    url = urljoin(url, response.getheader("Location", ""))
+                elif response.status in _RETRY_STATUS:
+                    raise _Busy(f"HTTP status {response.status}")
+                elif response.status != 200:
+                    error(f"can't get stock '{url}': {response.status}")
+                else:
+                    price = self._parse(response)
+            except BaseException:
+                conn.close()
+                raise
+            if response.length == 0:
+                response.read()  # Done, lets the connection be reused
+            if response.isclosed() and not response.will_close:
+                self._release(parts.scheme, parts.netloc, conn)
+            else:
+                conn.close()  # Stopped early, the rest of the page is unread
+            if response.status not in _REDIRECT_STATUS:
+                return price
+        return error(f"too many redirects for stock '{url}'")
+
+    def fetch(self, url):
+        "Returns the float price at url or None if the page has no price"
+        for attempt in range(self.retries + 1):
+            try:
+                return self._get(url)
+            except (OSError, HTTPException) as exc:
+                if attempt == self.retries:
+                    error(f"can't get stock '{url}': {exc}")
+                sleep(self.backoff * 2**attempt)
+        return None
+
+    def _fetch_or_none(self, url):
+        "Returns fetch() of url, None once its error is reported"
+        try:
+            return self.fetch(url)
+        except ErrorExit:
+            return None
+
+    def fetch_all(self, urls):
+        """
+        Returns a dict of url to fetch() price, fetched concurrently. One
+        url failing doesn't stop the rest, its price is None.
+        """
+        urls = list(dict.fromkeys(urls))
+        if len(urls) < 2:
+            return {url: self._fetch_or_none(url) for url in urls}
+        with ThreadPoolExecutor(min(self.workers, len(urls))) as pool:
+            return dict(zip(urls, pool.map(self._fetch_or_none, urls)))
+
+    def close(self):
+        "Closes every idle connection"
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
@@ -0,0 +1,106 @@
+"Local stand-in for online stock quote pages"
+
+from functools import cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+from time import sleep
+
+from log import info
+
+_CHUNK = 1 << 13  # Bytes of page written at a time
+
+
+@cache
+def _filler(padding):
+    "Returns the end of a page with padding bytes of filler, built once"
+    return b"<p>" + b"x" * max(padding - 7, 0) + b"</p></body></html>"
+
+
+class QuoteServer(ThreadingHTTPServer):
+    """
+    Serves a quote page at /TICKER with the price in a data-last-price div
+    like the online pages, so Stock and Fetcher can run offline. prices is
+    a dict of ticker to price, other tickers get price.
+
+    To exercise a client every response waits delay seconds, the first
+    fail requests for each path get a 503 and padding bytes of filler
+    follow the price. .requests, .connections and .sent count what
+    clients used.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        prices=None,
+        price=100.0,
+        delay=0.0,
+        fail=0,
+        padding=0,
+    ):
+        super().__init__((host, port), _Handler)
+        self.prices = dict(prices or {})
+        self.price = price
+        self.delay = delay
+        self.fail = fail
+        self.padding = padding
+        self.requests = self.connections = self.sent = 0
+        self.failed = {}
+        self.lock = Lock()
+
+    def url(self, ticker):
+        "Returns the quote page url for ticker"
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/{ticker}"
+
+    def page(self, ticker):
+        "Returns the quote page bytes for ticker"
+        price = self.prices.get(ticker, self.price)
+        html = (
+            "<html><head><title>Quote</title></head><body>"
+            f'<div class="price" data-last-price="{price}">{price}</div>'
+        )
+        return html.encode("utf-8") + _filler(self.padding)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, clients reuse connections
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        "Sends a quote page, or a 503 while failing"
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            failed = server.failed.get(self.path, 0)
+            if failed < server.fail:
+                server.failed[self.path] = failed + 1
+        if server.delay:
+            sleep(server.delay)
+        if failed < server.fail:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = server.page(self.path.strip("/"))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            for start in range(0, len(body), _CHUNK):
+                chunk = body[start : start + _CHUNK]
+                self.wfile.write(chunk)
+                with server.lock:
+                    server.sent += len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # Client stopped reading
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        info(f"{self.address_string()} {format % args}", level=1)
@@ -1,9 +1,9 @@
 "Salary generator"
 
-from datetime import timedelta
-from calendar import monthrange
+from itertools import repeat
 
 from income import Income
+from ledger import Ledger
 
 
 class Salary:
@@ -15,34 +15,43 @@ class Salary:
         self.percent = cfg.pay.increase.percent / 100.0
         self.post_increase += self.pre_increase * self.percent
 
+    def _gross(self, date):
+        if date >= self.cfg.pay.increase.start_date:
+            return self.post_increase
+        return self.pre_increase
+
+    def _fields(self):
+        # The federal exemption is split evenly across all paychecks.
+        return {
+            "personal_exemption": self.cfg.federal.personal_exemption / 24.0,
+            "term_life": float(self.cfg.pay.term_life),
+            "hsa": float(self.cfg.pay.hsa),
+            "fsa": float(self.cfg.pay.fsa),
+            "medical": float(self.cfg.pay.medical),
+            "dental": float(self.cfg.pay.dental),
+            "vision": float(self.cfg.pay.vision),
+            "vacation_buy": float(self.cfg.pay.vacation_buy),
+        }
+
     def __iter__(self):
-        friday = 4  # datetime.weekday() -> 0 is Monday, 6 is Sunday
         # Salary is paid 24 times a year, what the IRS calls "semimonthly",
-        # on the 15th and last day of the month. All dates are pulled back to
-        # the previous day when the payday is a bank holiday. Finally, all
-        # dates are pulled back to Friday if the payday falls on a weekend.
-        # The federal exemption is split evenly across all paychecks.
-        exemption = self.cfg.federal.personal_exemption / 24.0
-        for month in range(1, 13):
-            for day in (15, monthrange(self.cfg.year, month)[1]):
-                date = self.cfg.day(month, day)
-                # Adjust bank holidays first: may move paydate to a weekend
-                while self.cfg.bank_holiday(date):
-                    date -= timedelta(days=1)
-                # Back up if the date lands on a weekend
-                while date.weekday() > friday:
-                    date -= timedelta(days=1)
-                gross = self.pre_increase
-                if date >= self.cfg.pay.increase.start_date:
-                    gross = self.post_increase
-                income = Income(date, gross, "salary")
-                income.personal_exemption = exemption
-                income.term_life = float(self.cfg.pay.term_life)
-                income.hsa = float(self.cfg.pay.hsa)
-                income.fsa = float(self.cfg.pay.fsa)
-                income.medical = float(self.cfg.pay.medical)
-                income.dental = float(self.cfg.pay.dental)
-                income.vision = float(self.cfg.pay.vision)
-                income.vacation_buy = float(self.cfg.pay.vacation_buy)
-                income.withhold = self.cfg.withhold_amount(date)
-                yield income
+        # on the 15th and last day of the month moved off bank holidays and
+        # weekends, see holidays.paydays().
+        fields = self._fields()
+        for date in self.cfg.paydays():
+            income = Income(date, self._gross(date), "salary")
+            for attr, value in fields.items():
+                setattr(income, attr, value)
+            yield income
+
+    def ledger(self):
+        "Returns the paychecks as a Ledger built a column at a time"
+        dates = list(self.cfg.paydays())
+        values = {
+            attr: repeat(value, len(dates))
+            for attr, value in self._fields().items()
+        }
+        values["date"] = dates
+        values["kind"] = repeat("salary", len(dates))
+        values["gross"] = map(self._gross, dates)
+        return Ledger.from_columns(len(dates), values)
@@ -1,9 +1,41 @@
 "401k pre and post tax savings"
 
+from bisect import bisect_left
 from datetime import timedelta
+from json import dumps as json_dumps
+from json import loads as json_loads
 from math import ceil, floor
 
+from dateindex import DateIndex
+from joint import Joint
+from ledger import Ledger
 from log import error, info
+from optional import optional
+from profiler import count
+from search import Search
+
+# Relative distance where prefix sum and paycheck by paycheck amounts may
+# disagree because of float rounding.
+_TOLERANCE = 1e-9
+
+# Enumerated candidates (duplicates included) above which the NumPy scorer
+# is picked by default. Warm it saves about 0.6us a candidate, importing and
+# warming it up costs about 200ms, so only searches this big win overall.
+# A normal run has a few hundred.
+_NUMPY_CANDIDATES = 300_000
+
+# Income fields a run writes, copied back into a Ledger's salary rows.
+_WRITES = (
+    "percent_401k",
+    "contrib_401k",
+    "contrib_401k_match",
+    "percent_401k_post",
+    "contrib_401k_post",
+    "ytd_401k",
+    "ytd_401k_match",
+    "ytd_401k_post",
+    "ytd_401k_total",
+)
 
 
 class Savings:
@@ -39,10 +71,33 @@ class Savings:
     TODAY in this context refers to the day the program is executed. Any pay
     periods within tweak_limit calendar days of TODAY are considered too
     close to alter and are treated as part of the increase interval.
+
+    When cfg.save.change_dates is set the tweak interval is replaced by one
+    interval per change date and the schedule comes from Search instead of
+    the start/increase/tweak enumeration.
+
+    Candidates are scored in pure Python unless the search is big enough to
+    pay for loading NumPy, backend="python" or "numpy" forces one scorer.
+    Both pick the same schedules.
+
+    ytd=False leaves the 401k YTD values to the caller, see engine.py.
+    optimize=False stops once the paychecks and caps are set up, before
+    choosing any schedule, see benchmark.py.
     """
 
-    def __init__(self, cfg, income_list, change=1, tweak_limit=7):
+    def __init__(
+        self,
+        cfg,
+        income_list,
+        change=1,
+        tweak_limit=7,
+        backend=None,
+        ytd=True,
+        optimize=True,
+    ):
+        # pylint: disable=too-many-statements,too-many-locals,too-many-branches
         self.cfg = cfg
+        self.backend = _backend(backend)
         self.income = income_list
         self.tweak_date = self.cfg.today() + timedelta(days=tweak_limit)
 
@@ -56,31 +111,57 @@ class Savings:
         self.change = change
 
         # Contributions only apply to regular salary paychecks. Collect them
-        # here for analysis and contribution optimization.
-        self.salary = []
-        for income in income_list:
-            if income.kind == "salary":
-                if income.date < self.cfg.pay.increase.start_date:
-                    self.paychecks_start += 1
-                elif self.paychecks_increase < 0:
-                    # Require at least 1 pay-period for increase.
-                    self.paychecks_increase += 1
-                elif income.date >= self.tweak_date:
-                    self.paychecks_tweak += 1
-                else:
-                    self.paychecks_increase += 1
-                self.salary.append(income)
+        # here for analysis and contribution optimization. A Ledger's salary
+        # rows are copied out once and written back at the end.
+        self.rows = None
+        if isinstance(income_list, Ledger):
+            self.rows = [
+                index
+                for index, kind in enumerate(income_list.column("kind"))
+                if kind == "salary"
+            ]
+            self.salary = income_list.income(self.rows)
+        else:
+            self.salary = [inc for inc in income_list if inc.kind == "salary"]
+        index = DateIndex(self.salary)
+        start = index.before(self.cfg.pay.increase.start_date)
+        # The increase_shift paychecks after start always go to increase.
+        shift = min(max(-self.paychecks_increase, 0), len(self.salary) - start)
+        tweak = len(self.salary) - max(
+            start + shift, index.before(self.tweak_date)
+        )
+        self.paychecks_start += start
+        self.paychecks_increase += len(self.salary) - start - tweak
+        self.paychecks_tweak += tweak
         self.paychecks_total = self.paychecks_start
         self.paychecks_total += self.paychecks_increase
         self.paychecks_total += self.paychecks_tweak
         if self.paychecks_total != len(self.salary):
             error("wrong paycheck count")
+        self.prefix = [0.0]
+        for income in self.salary:
+            self.prefix.append(self.prefix[-1] + income.gross)
         self.cap_pre = float(self.cfg.save.cap_pre)
         self.cap_post = self.cfg.save.cap - self.cap_pre
+        if not optimize:
+            return
+
+        # Warm start from the last run's schedules, see ._choose().
+        self.state = None
+        if self.cfg.save.warm_start:
+            self.state = self.cfg.filename.parent / "savings-state.json"
+        inputs, previous = self._inputs(), self._load()
+
+        # Joint mode picks both schedules up front, see joint.py.
+        joint = None, None
+        if self.cfg.save.joint and not _same(previous, inputs):
+            joint = Joint(
+                self, self.cfg.save.joint, self.cfg.save.workers
+            ).solve()
 
         # Calculate pre-tax contributions. MUST BE DONE FIRST!
         percent_match = self.cfg.save.percent_match / 100.0
-        self.best_pre = self._opt("pre")
+        self.best_pre = self._choose("pre", joint[0], inputs, previous)
         info(
             f"# savings best pre-tax: {','.join(map(str, self.best_pre))}",
             level=3,
@@ -96,7 +177,7 @@ class Savings:
             self.cap_post -= income.contrib_401k_match  # Adjust for post-tax
 
         # Calculate post-tax contributions. MUST BE DONE SECOND!
-        self.best_post = self._opt("post")
+        self.best_post = self._choose("post", joint[1], inputs, previous)
         info(
             f"# savings best post-tax: {','.join(map(str, self.best_post))}",
             level=3,
@@ -108,7 +189,111 @@ class Savings:
             income.contrib_401k_post = min(contrib, ytd_left)
             ytd_left -= income.contrib_401k_post
 
-        self._ytd()
+        self._save(inputs)
+        if ytd:
+            self._ytd()
+        if self.rows is not None:
+            income_list.store(self.rows, self.salary, _WRITES)
+
+    def _inputs(self):
+        """
+        Returns a dict of everything that decides the optimizer's answer, in
+        JSON form. TODAY only matters through how paychecks are split into
+        intervals, so re-runs between paychecks compare equal.
+        """
+        save = self.cfg.save
+        inputs = {
+            "dates": [income.date.strftime("%D") for income in self.salary],
+            "gross": [income.gross for income in self.salary],
+            "cap": save.cap,
+            "cap_pre": save.cap_pre,
+            "percent_match": save.percent_match,
+            "change": self.change,
+            "paychecks_start": self.paychecks_start,
+            "paychecks_tweak": self.paychecks_tweak,
+            "change_dates": [d.strftime("%D") for d in save.change_dates],
+            "joint": save.joint,
+        }
+        for suffix in "pre", "post":
+            holder = getattr(save, f"percent_{suffix}")
+            inputs[suffix] = [holder.start, holder.increase, holder.manual]
+        return json_loads(json_dumps(inputs))
+
+    def _load(self):
+        "Returns the saved warm start state dict or None"
+        if self.state is None or not self.state.is_file():
+            return None
+        previous = json_loads(self.state.read_text("utf-8"))
+        for suffix in "pre", "post":
+            best = previous.get(f"best_{suffix}")
+            if not isinstance(best, list) or len(best) != len(self.salary):
+                return None
+        return previous
+
+    def _save(self, inputs):
+        "Saves the chosen schedules and their inputs for the next warm start"
+        if self.state is None:
+            return
+        data = {
+            "inputs": inputs,
+            "best_pre": self.best_pre,
+            "best_post": self.best_post,
+        }
+        json = json_dumps(data, sort_keys=True, indent=2)
+        self.state.write_text(f"{json}\n", encoding="utf-8")
+
+    def _choose(self, suffix, joint, inputs, previous):
+        """
+        Returns the list of percentages for suffix ('pre' / 'post'): the
+        saved answer when the inputs didn't change, the joint answer in
+        joint mode, a search outward from the saved answer when there is
+        one, and the full optimizer otherwise.
+        """
+        if _same(previous, inputs):
+            info(f"# savings warm start: {suffix} unchanged", level=3)
+            return previous[f"best_{suffix}"]
+        if self.cfg.save.joint:
+            return joint
+        holder = getattr(self.cfg.save, f"percent_{suffix}")
+        if previous and not holder.manual and not self.cfg.save.change_dates:
+            best = self._opt_warm(suffix, previous[f"best_{suffix}"])
+            if best is not None:
+                info(f"# savings warm start: {suffix} re-tweaked", level=3)
+                return best
+        return self._opt(suffix)
+
+    def _opt_warm(self, suffix, last):
+        """
+        Returns the last schedule re-tweaked to land closest over cap, None
+        when that isn't possible. Paychecks before tweak_date are already
+        set and keep their last percent. The remaining paychecks keep the
+        percent before them and may switch to a single tweak percent, within
+        change of it, for a final run of count_tweak paychecks: the same
+        shape the full optimizer makes. Tweak percents are tried outward
+        from the kept one so the smallest change wins ties.
+        """
+        if self.paychecks_tweak == 0:
+            return None
+        cap = getattr(self, f"cap_{suffix}")
+        window = self.paychecks_total - self.paychecks_tweak
+        keep = last[window - 1] if window else last[window]
+        deltas = [0]
+        for delta in range(1, self.change + 1):
+            deltas += [delta, -delta]
+        best, best_amount = None, None
+        for delta in deltas:
+            tweak = keep + delta
+            if not 0 <= tweak <= 100:
+                continue
+            for count_tweak in range(1, self.paychecks_tweak + 1):
+                attempt = last[:window]
+                attempt += [keep] * (self.paychecks_tweak - count_tweak)
+                attempt += [tweak] * count_tweak
+                amount = self._amount_list(attempt)
+                if amount > cap:
+                    if best_amount is None or amount < best_amount:
+                        best, best_amount = attempt, amount
+        return best
 
     def _ytd(self):
         "Adds 401k final ytd values to all salaried incomes"
@@ -122,14 +307,16 @@ class Savings:
             income.ytd_401k_post = ytd_post
             income.ytd_401k_total = ytd + ytd_match + ytd_post
 
-    def _setup(self, suffix):
+    def _setup(self, suffix, cap=None):
         """
         Sets up key variables for the 401k optimizer based on suffix string,
-        which MUST be 'pre' or 'post'.
+        which MUST be 'pre' or 'post'. The cap defaults to the current cap
+        for suffix.
         """
         # Select the pre or post holder (from cfg) and cap
         holder = getattr(self.cfg.save, f"percent_{suffix}")
-        cap = getattr(self, f"cap_{suffix}")
+        if cap is None:
+            cap = getattr(self, f"cap_{suffix}")
         if holder.manual:
             if len(holder.manual) != len(self.salary):
                 error(f"manual list '{suffix}' wrong length")
@@ -152,49 +339,296 @@ class Savings:
                 )
         return [], start_list, holder.increase, cap
 
-    def _attempts(self, start_iter, increase_user):
+    def schedules(self, suffix, cap_low, cap_high):
+        """
+        Returns a list of (percentages, amount) for every unique candidate
+        schedule for suffix ('pre' / 'post') with an amount over cap_low.
+        Start percents cover the best fit for any cap up to cap_high.
+        """
+        manual, start_list, increase, _ = self._setup(suffix, cap_low)
+        if manual:
+            candidates = [None]
+        else:
+            _, start_high, _, _ = self._setup(suffix, cap_high)
+            starts = set()
+            for start_iter in start_list + start_high:
+                starts.update(start_iter)
+            candidates = self._candidates([sorted(starts)], increase)
+        found = []
+        for candidate in candidates:
+            percents = manual or self._attempt(candidate)
+            amount = self._amount_list(percents)
+            if amount > cap_low:
+                found.append((percents, amount))
+        return found
+
+    def _candidates(self, start_list, increase_user):
+        """
+        Yields unique (start, increase, tweak, count_tweak) candidates for the
+        entire year of salaried pay. Candidates that expand to the same list
+        of percentages are only yielded the first time they're seen, which
+        keeps the order (and tie-breaking) of a full enumeration.
+        """
+        seen = set()
+        for start_iter in start_list:
+            for start in start_iter:
+                for candidate in self._candidates_start(start, increase_user):
+                    key = self._key(candidate)
+                    if key not in seen:
+                        seen.add(key)
+                        yield candidate
+
+    def _candidates_start(self, start, increase_user):
+        "Yields all candidates, duplicates included, for a start percent"
+        increase_iter = (increase_user,)
+        if increase_user == 0:
+            increase_iter = range(start - self.change, start + self.change + 1)
+        for increase in increase_iter:
+            for tweak in range(
+                increase - self.change, increase + self.change + 1
+            ):
+                for count_tweak in range(0, self.paychecks_tweak):
+                    yield start, increase, tweak, count_tweak
+
+    def _key(self, candidate):
         """
-        Yields lists of contribution attempts for the entire year of salaried
-        pay, all will have the len(self.salary). The routine may produce the
-        same list more than once: it's faster to test than save all of them
-        and check if we already tried it.
+        Returns a canonical key for a candidate: empty runs take the value of
+        their neighbour and equal neighbouring runs merge. Two candidates
+        expand to the same list of percentages only if their keys match.
         """
+        start, increase, tweak, count_tweak = candidate
+        split = self.paychecks_total - count_tweak
+        if count_tweak == 0:
+            tweak = increase
+        if split == self.paychecks_start:
+            increase = tweak
+        if increase == tweak:
+            split = self.paychecks_total
+        if self.paychecks_start == 0:
+            start = increase
+        return start, increase, tweak, split
+
+    def _attempt(self, candidate):
+        "Returns the list of percentages for a candidate tuple"
+        start, increase, tweak, count_tweak = candidate
         count_rest = self.paychecks_total - self.paychecks_start
-        for start in start_iter:
-            increase_iter = (increase_user,)
+        final = [start] * self.paychecks_start
+        final += [increase] * (count_rest - count_tweak)
+        final += [tweak] * count_tweak
+        if len(final) != len(self.salary):
+            error("bad attempt")
+        return final
+
+    def _amount(self, candidate):
+        """
+        Returns the contribution amount for a candidate tuple in O(1) using
+        the cumulative gross prefix sums of salaried pay.
+        """
+        start, increase, tweak, count_tweak = candidate
+        prefix, paychecks_start = self.prefix, self.paychecks_start
+        split = self.paychecks_total - count_tweak
+        amount = start * prefix[paychecks_start]
+        amount += increase * (prefix[split] - prefix[paychecks_start])
+        amount += tweak * (prefix[-1] - prefix[split])
+        return amount / 100.0
+
+    def _amount_exact(self, candidate):
+        "Returns the paycheck by paycheck contribution amount for a candidate"
+        return self._amount_list(self._attempt(candidate))
+
+    def _amount_list(self, percents):
+        "Returns the paycheck by paycheck contribution amount for percents"
+        amount = 0.0
+        for income, percent in zip(self.salary, percents):
+            amount += income.gross * (percent / 100.0)
+        return amount
+
+    def _candidates_numpy(self, start_list, increase_user):
+        """
+        Returns a (candidates, 4) int array of unique candidates in the same
+        order as ._candidates(), built and de-duplicated without Python
+        loops.
+        """
+        # pylint: disable=too-many-locals
+        np = optional("numpy")
+        change = np.arange(-self.change, self.change + 1)
+        counts = np.arange(self.paychecks_tweak)
+        grids = []
+        for start_iter in start_list:
+            starts = np.asarray(start_iter)
             if increase_user == 0:
-                increase_iter = range(
-                    start - self.change, start + self.change + 1
+                grid = list(
+                    np.meshgrid(starts, change, change, counts, indexing="ij")
                 )
-            for increase in increase_iter:
-                for tweak in range(
-                    increase - self.change, increase + self.change + 1
-                ):
-                    for count_tweak in range(0, self.paychecks_tweak):
-                        final = [start] * self.paychecks_start
-                        final += [increase] * (count_rest - count_tweak)
-                        final += [tweak] * count_tweak
-                        if len(final) != len(self.salary):
-                            error("bad attempt")
-                        yield final
+                grid[1] = grid[0] + grid[1]
+            else:
+                grid = list(
+                    np.meshgrid(
+                        starts, [increase_user], change, counts, indexing="ij"
+                    )
+                )
+            grid[2] = grid[1] + grid[2]
+            grids.append(np.stack([g.ravel() for g in grid], axis=1))
+        raw = np.concatenate(grids)
+        start, increase, tweak, count_tweak = raw.T.copy()
+        split = self.paychecks_total - count_tweak
+        tweak[count_tweak == 0] = increase[count_tweak == 0]
+        empty = split == self.paychecks_start
+        increase[empty] = tweak[empty]
+        split[increase == tweak] = self.paychecks_total
+        if self.paychecks_start == 0:
+            start = increase
+        # Pack the key columns into one int64 for a fast 1-D unique.
+        low = raw[:, :3].min()
+        radix = raw[:, :3].max() - low + 1
+        keys = (start - low) * radix + (increase - low)
+        keys = (keys * radix + (tweak - low)) * (self.paychecks_total + 1)
+        _, first = np.unique(keys + split, return_index=True)
+        return raw[np.sort(first)]
+
+    def _amounts_numpy(self, candidates):
+        """
+        Returns the contribution amounts for a candidates array as a single
+        (candidates x paychecks) percentage matrix times gross vector.
+        """
+        np = optional("numpy")
+        start, increase, tweak, count_tweak = candidates.T
+        split = (self.paychecks_total - count_tweak)[:, None]
+        index = np.arange(self.paychecks_total)[None, :]
+        percent = np.where(index < split, increase[:, None], tweak[:, None])
+        percent[:, : self.paychecks_start] = start[:, None]
+        gross = np.fromiter((income.gross for income in self.salary), float)
+        return (percent / 100.0) @ gross
+
+    def _near(self, amounts, cap, numpy=False):
+        """
+        Returns the indexes of amounts that can be the closest over cap. The
+        scored amounts can differ from a paycheck by paycheck sum by float
+        rounding, so everything within rounding distance of cap or the
+        lowest amount is kept for an exact check.
+        """
+        eps = _TOLERANCE * max(cap, 1.0)
+        if numpy:
+            np = optional("numpy")
+            over = amounts > cap - eps
+            if not over.any():
+                return []
+            lowest = np.min(amounts, where=amounts > cap + eps, initial=np.inf)
+            return np.flatnonzero(over & (amounts <= lowest + eps)).tolist()
+        lowest = min((a for a in amounts if a > cap + eps), default=None)
+        near = []
+        for index, amount in enumerate(amounts):
+            if amount <= cap - eps:
+                continue
+            if lowest is not None and amount > lowest + eps:
+                continue
+            near.append(index)
+        return near
+
+    def _closest(self, candidates, near, cap):
+        """
+        Returns the candidate with the smallest amount over cap from the
+        near indexes, re-summed paycheck by paycheck. The first one wins
+        ties.
+        """
+        best, best_amount = None, None
+        for index in near:
+            candidate = tuple(int(value) for value in candidates[index])
+            amount = self._amount_exact(candidate)
+            if amount > cap:
+                if best_amount is None or amount < best_amount:
+                    best, best_amount = candidate, amount
+        return best
 
     def _opt(self, suffix):
         """
         The optimizer. Short circuits if the user has a manual list in cfg.
-        Otherwise it relies on ._attempts() to create list attempts to
-        check for best fit, closest to cap + 0.01.
+        Otherwise it scores every unique candidate from ._candidates() to
+        find the best fit, closest to cap + 0.01: with prefix sums in pure
+        Python or one matrix-vector product with NumPy.
         Returns the best list found for prefix suffix ('pre' / 'post').
         """
         manual, start_list, increase, cap = self._setup(suffix)
         if manual:
             return manual
-        best, best_amount = None, None
+        if self.cfg.save.change_dates:
+            return self._opt_search(start_list, increase, cap)
+        backend = self.backend or self._auto(start_list, increase)
+        if backend == "numpy":
+            if self.paychecks_tweak == 0:
+                return None
+            candidates = self._candidates_numpy(start_list, increase)
+            amounts = self._amounts_numpy(candidates)
+        else:
+            candidates = list(self._candidates(start_list, increase))
+            amounts = [self._amount(candidate) for candidate in candidates]
+        count("savings candidates", len(candidates))
+        near = self._near(amounts, cap, numpy=backend == "numpy")
+        best = self._closest(candidates, near, cap)
+        if best is None:
+            return None
+        return self._attempt(best)
+
+    def _auto(self, start_list, increase_user):
+        "Returns the backend for a search, see _NUMPY_CANDIDATES"
+        width = 2 * self.change + 1
+        total = sum(len(starts) for starts in start_list)
+        total *= width * self.paychecks_tweak
+        if increase_user == 0:
+            total *= width
+        if total > _NUMPY_CANDIDATES and optional("numpy") is not None:
+            return "numpy"
+        return "python"
+
+    def _bounds(self):
+        """
+        Returns the sorted paycheck indexes where the start, increase and
+        cfg.save.change_dates intervals begin, plus the paycheck count.
+        """
+        dates = [income.date for income in self.salary]
+        bounds = {0, self.paychecks_start, len(self.salary)}
+        for date in self.cfg.save.change_dates:
+            bounds.add(bisect_left(dates, date))
+        return sorted(b for b in bounds if 0 <= b <= len(self.salary))
+
+    def _opt_search(self, start_list, increase, cap):
+        """
+        Returns the best list of percentages over the start, increase and
+        cfg.save.change_dates intervals found by Search, None if no schedule
+        gets over cap.
+        """
+        bounds = self._bounds()
+        first = set()
         for start_iter in start_list:
-            for attempt in self._attempts(start_iter, increase):
-                amount = 0.0
-                for index, income in enumerate(self.salary):
-                    amount += income.gross * (attempt[index] / 100.0)
-                if amount > cap:
-                    if best_amount is None or amount < best_amount:
-                        best, best_amount = attempt, amount
-        return best
+            first.update(start_iter)
+        gross, fixed = [], {}
+        for index, (lo, hi) in enumerate(zip(bounds, bounds[1:])):
+            gross.append(self.prefix[hi] - self.prefix[lo])
+            if lo == self.paychecks_start and increase != 0:
+                if index == 0:
+                    first = {increase}  # No start interval
+                else:
+                    fixed[index] = increase
+        best, _ = Search(gross, self.change, cap, fixed).closest(first)
+        if best is None:
+            return None
+        final = []
+        for percent, lo, hi in zip(best, bounds, bounds[1:]):
+            final += [percent] * (hi - lo)
+        return final
+
+
+def _same(previous, inputs):
+    "Returns True when a saved warm start state has exactly inputs"
+    return previous is not None and previous.get("inputs") == inputs
+
+
+def _backend(backend):
+    "Returns the optimizer backend name, None picks one per search"
+    if backend is None:
+        return None
+    if backend not in ("python", "numpy"):
+        error(f"invalid savings backend '{backend}'")
+    if backend == "numpy" and optional("numpy") is None:
+        error("savings backend 'numpy' requires numpy")
+    return backend
@@ -0,0 +1,122 @@
+"Read RSU vest and supplimental income schedules from CSV or JSON files"
+
+from csv import DictReader
+from json import JSONDecodeError, JSONDecoder
+from json import loads as json_loads
+from pathlib import Path
+
+from log import error
+
+# Columns of each schedule kind, the arguments of Config.rsu() and
+# Config.supplimental(). The first ones are required.
+COLUMNS = {
+    "rsu": (
+        ("month", "day", "quantity"),
+        ("price", "percent_tax_federal"),
+    ),
+    "supplimental": (
+        ("month", "day", "gross", "kind"),
+        ("percent_tax_federal",),
+    ),
+}
+
+_INTS = ("month", "day")
+_STRINGS = ("kind",)
+
+
+def _rows(path):
+    """
+    Yields (line number, dict) for every entry of path. CSV files have a
+    header row naming the columns, JSON files either hold one object per
+    line (JSON Lines) or one array of objects. Blank lines are skipped.
+    """
+    with path.open(encoding="utf-8", newline="") as file:
+        if path.suffix.lower() == ".csv":
+            reader = DictReader(file, skipinitialspace=True)
+            for row in reader:
+                if any(value not in (None, "") for value in row.values()):
+                    yield reader.line_num, row
+            return
+        text = file.read()
+    if text.lstrip().startswith("["):
+        yield from _array(path, text)
+        return
+    for number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json_loads(line)
+        except JSONDecodeError as exc:
+            error(f"{path}:{number}: invalid JSON, {exc.msg}")
+        if not isinstance(row, dict):
+            error(f"{path}:{number}: expected a JSON object")
+        yield number, row
+
+
+def _array(path, text):
+    """
+    Yields (line number, dict) for every object of a JSON array, numbered
+    by the line each object starts on
+    """
+    try:
+        rows = json_loads(text)
+    except JSONDecodeError as exc:
+        error(f"{path}:{exc.lineno}: invalid JSON, {exc.msg}")
+    decoder, at = JSONDecoder(), text.index("[") + 1
+    for row in rows:
+        while text[at].isspace() or text[at] == ",":
+            at += 1
+        number = text.count("\n", 0, at) + 1
+        if not isinstance(row, dict):
+            error(f"{path}:{number}: expected a JSON object")
+        _, at = decoder.raw_decode(text, at)
+        yield number, row
+
+
+def _value(where, name, value):
+    "Returns value converted for column name"
+    if name in _STRINGS:
+        if not isinstance(value, str) or not value:
+            error(f"{where}: bad {name} '{value}'")
+        return value
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        error(f"{where}: bad {name} '{value}'")
+    if name in _INTS:
+        if not number.is_integer():
+            error(f"{where}: bad {name} '{value}'")
+        return int(number)
+    if name == "percent_tax_federal" and number < 0.0:
+        error(f"{where}: negative {name} '{value}'")
+    return number
+
+
+def read(filename, kind):
+    """
+    Yields (where, dict of column values) for each entry of a kind schedule
+    file, where is "file:line" for error messages. Optional columns left
+    empty or out are missing from the dict.
+    """
+    if kind not in COLUMNS:
+        error(f"invalid schedule kind '{kind}'")
+    required, optional = COLUMNS[kind]
+    path = Path(filename)
+    if not path.is_file():
+        error(f"can't find schedule '{path}'")
+    for number, row in _rows(path):
+        where = f"{path}:{number}"
+        if None in row:
+            error(f"{where}: more fields than columns")
+        unknown = set(row) - set(required) - set(optional)
+        if unknown:
+            error(f"{where}: unknown columns {', '.join(map(str, unknown))}")
+        values = {}
+        for name in required + optional:
+            value = row.get(name)
+            if value in (None, ""):
+                if name in required:
+                    error(f"{where}: missing {name}")
+                continue
+            values[name] = _value(where, name, value)
+        yield where, values
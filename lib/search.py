@@ -0,0 +1,149 @@
+"Exact search for 401(k) contribution schedules with many change points"
+
+from bisect import bisect_left, bisect_right
+
+from profiler import count
+
+# Relative distance where two amounts are treated as the same amount.
+_TOLERANCE = 1e-9
+
+
+class Search:
+    """
+    Finds the per-interval contribution percentages whose total is the
+    smallest amount over cap. Interval k pays gross[k] in total and its
+    percent may differ from interval k - 1 by at most change. Percents are
+    whole numbers from 0 to 100 and fixed maps an interval to a locked
+    percent.
+
+    The search is a dynamic program over (interval, percent) states. A
+    forward pass finds the smallest and largest contribution that can come
+    before each state. A backward pass then builds the sorted set of
+    contributions each state can still add, pruned against the remaining
+    cap: values that can't get any prefix over cap are dropped, and above
+    the point where every prefix is over cap only the smallest value is
+    kept. Paychecks in an interval share the same gross so many schedules
+    collapse to the same value, which keeps the sets small instead of the
+    (2 * change + 1) ** intervals schedules an enumeration would visit.
+
+    Ties on amount go to the lexicographically smallest schedule, so the
+    result doesn't depend on search order.
+    """
+
+    def __init__(self, gross, change, cap, fixed=None):
+        self.gross = [float(value) / 100.0 for value in gross]
+        self.change = change
+        self.cap = float(cap)
+        self.fixed = dict(fixed or {})
+        self.eps = _TOLERANCE * max(self.cap, 1.0)
+        self.states = 0
+        self.prefix_min, self.prefix_max, self.rest = [], [], []
+
+    def _allowed(self, index, first):
+        "Returns the percents interval index may use, ignoring neighbours"
+        percents = first if index == 0 else range(101)
+        if index in self.fixed:
+            percents = [p for p in percents if p == self.fixed[index]]
+        return [p for p in percents if 0 <= p <= 100]
+
+    def _neighbours(self, index, percent):
+        "Yields reachable percents of interval index within change of percent"
+        reachable = self.prefix_min[index]
+        for prev in range(percent - self.change, percent + self.change + 1):
+            if prev in reachable:
+                yield prev
+
+    def _forward(self, first):
+        """
+        Fills prefix_min/prefix_max: per interval a dict of reachable percent
+        to the smallest/largest contribution paid before that interval.
+        """
+        self.prefix_min = [{p: 0.0 for p in self._allowed(0, first)}]
+        self.prefix_max = [dict(self.prefix_min[0])]
+        for index in range(1, len(self.gross)):
+            gross = self.gross[index - 1]
+            low, high = {}, {}
+            for percent in self._allowed(index, first):
+                for prev in self._neighbours(index - 1, percent):
+                    amount = self.prefix_min[index - 1][prev] + prev * gross
+                    low[percent] = min(low.get(percent, amount), amount)
+                    amount = self.prefix_max[index - 1][prev] + prev * gross
+                    high[percent] = max(high.get(percent, amount), amount)
+            self.prefix_min.append(low)
+            self.prefix_max.append(high)
+
+    def _backward(self):
+        """
+        Fills rest: per interval a dict of percent to the sorted list of
+        contributions from that interval to the end of the year.
+        """
+        intervals = len(self.gross)
+        self.rest = [{} for _ in range(intervals)]
+        for index in range(intervals - 1, -1, -1):
+            for percent in self.prefix_min[index]:
+                amount = percent * self.gross[index]
+                values = [amount]
+                if index < intervals - 1:
+                    values = []
+                    for succ in range(
+                        percent - self.change, percent + self.change + 1
+                    ):
+                        for value in self.rest[index + 1].get(succ, ()):
+                            values.append(amount + value)
+                values = self._prune(index, percent, sorted(values))
+                if values:
+                    self.rest[index][percent] = values
+                    self.states += len(values)
+
+    def _prune(self, index, percent, values):
+        """
+        Returns values without duplicates and without values no prefix of
+        (index, percent) can use to finish closest over cap.
+        """
+        low = self.cap - self.prefix_max[index][percent] - self.eps
+        high = self.cap - self.prefix_min[index][percent]
+        pruned = []
+        for value in values[bisect_right(values, low) :]:
+            if pruned and value - pruned[-1] <= self.eps:
+                continue
+            pruned.append(value)
+            if value > high:
+                break  # Every prefix is over cap, the rest can't be closer
+        return pruned
+
+    def _reaches(self, index, percent, target):
+        "Returns True if (index, percent) can add target to the total"
+        values = self.rest[index].get(percent, ())
+        at = bisect_left(values, target - self.eps)
+        return at < len(values) and values[at] <= target + self.eps
+
+    def closest(self, first):
+        """
+        Returns (schedule, amount) for the best schedule whose first interval
+        percent is in first, (None, None) when nothing gets over cap.
+        """
+        if not self.gross:
+            return None, None
+        self._forward(sorted(set(first)))
+        self._backward()
+        count("search states", self.states)
+        best_amount = None
+        for values in self.rest[0].values():
+            at = bisect_right(values, self.cap)
+            if at < len(values):
+                if best_amount is None or values[at] < best_amount:
+                    best_amount = values[at]
+        if best_amount is None:
+            return None, None
+        # Walk forward picking the smallest percent that still reaches the
+        # best amount for the lexicographically smallest schedule.
+        schedule, amount = [], 0.0
+        for index, gross in enumerate(self.gross):
+            for percent in sorted(self.rest[index]):
+                if schedule and abs(percent - schedule[-1]) > self.change:
+                    continue
+                if self._reaches(index, percent, best_amount - amount):
+                    schedule.append(percent)
+                    amount += percent * gross
+                    break
+        return tuple(schedule), amount
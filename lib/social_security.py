@@ -1,26 +1,60 @@
 "Social security tax"
 
+from array import array
+from itertools import accumulate, repeat
+from operator import mul
+
+from ledger import Ledger
+
 
 class SocialSecurity:
     "Social Security tax calculations."
 
-    def __init__(self, cfg, income_list):
-        percent = cfg.social_security.percent / 100.0
-        amount_max = cfg.social_security.cap * percent
-        ytd = 0.0
+    def __init__(self, cfg, income_list=()):
+        self.percent = cfg.social_security.percent / 100.0
+        self.amount_max = cfg.social_security.cap * self.percent
+        self.ytd = 0.0
+        if isinstance(income_list, Ledger):
+            self._add_columns(income_list, cfg.pay.term_life)
+            return
         for income in income_list:
-            amount = income.gross
-            if income.kind == "salary":
-                amount += cfg.pay.term_life
-                amount -= income.fsa
-                amount -= income.hsa
-                amount -= income.dental
-                amount -= income.medical
-                amount -= income.vision
-                amount -= income.vacation_buy
-            tax = amount * percent
-            if tax + ytd > amount_max:
-                tax = amount_max - ytd
-            ytd += tax
-            income.tax_social = tax
-            income.ytd_tax_social = ytd
+            self.add(income, income.fica_wage(cfg.pay.term_life))
+
+    def add(self, income, amount):
+        """
+        Adds Social Security tax on amount, the FICA taxable wage, to the
+        next income, incomes come in pay order
+        """
+        income.tax_social = self._tax(amount)
+        income.ytd_tax_social = self.ytd
+
+    def _add_columns(self, ledger, term_life):
+        """
+        Column version of .add() over a whole Ledger, only incomes from the
+        one reaching the cap on need a look one at a time
+        """
+        wages = ledger.fica_wages(term_life)
+        taxes = array("d", map(mul, wages, repeat(self.percent)))
+        ytd = list(accumulate(taxes))
+        capped = next(
+            (
+                index
+                for index, total in enumerate(ytd)
+                if total > self.amount_max
+            ),
+            len(ytd),
+        )
+        if capped:
+            self.ytd = ytd[capped - 1]
+        for index in range(capped, len(taxes)):
+            taxes[index] = self._tax(wages[index])
+        ledger.set_column("tax_social", taxes)
+        ledger.cumulative("tax_social", "ytd_tax_social")
+
+    def _tax(self, amount):
+        "Returns the tax on the next income's FICA taxable wage"
+        tax = amount * self.percent
+        if tax + self.ytd > self.amount_max:
+            tax = self.amount_max - self.ytd
+        self.ytd += tax
+        return tax
@@ -1,86 +1,184 @@
 "Fetch a stock price from online"
 
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
-from html.parser import HTMLParser
+from fcntl import LOCK_EX, flock
+from functools import cache
+from json import JSONDecodeError
 from json import dumps as json_dumps
 from json import loads as json_loads
+from os import replace
 from pathlib import Path
-from urllib import request
+from tempfile import NamedTemporaryFile
 
 from log import error
+from profiler import count
 
 _BASE = Path(__file__).parent.resolve()
 
+# Price dicts already read or fetched by this process, by (cache, url).
+_MEMO = {}
 
-class _Parser(HTMLParser):
-    "Supports Stock class in parsing online HTML for a stock url."
 
-    def handle_starttag(self, tag, attrs):
-        "finds div attr data-last-price"
-        if hasattr(self, "_last_price"):
-            return
-        if tag == "div":
-            for key, value in attrs:
-                if key == "data-last-price":
-                    setattr(self, "_last_price", float(value))
-                    return
+@cache
+def _fetcher():
+    """
+    Returns the Fetcher shared by this process. quotes.py and http.client
+    load on the first fetch, cached prices never need them.
+    """
+    # pylint: disable-next=import-outside-toplevel
+    from quotes import Fetcher
 
-    def last_price(self):
-        "Returns the last price or None if not found"
-        return getattr(self, "_last_price", None)
+    return Fetcher()
+
+
+def _price_dict(url, price):
+    "Returns the cache's price dict for a price fetched now"
+    if price is None:
+        error(f"can't get stock '{url}'")
+    time_utc = datetime.now(timezone.utc)
+    return {
+        "time_utc": [
+            time_utc.year,
+            time_utc.month,
+            time_utc.day,
+            time_utc.hour,
+            time_utc.minute,
+            time_utc.second,
+        ],
+        "url": url,
+        "price": price,
+    }
+
+
+def prices(urls, cache_name="stock-price", cache_hours=24):
+    """
+    Returns a dict of url to float price. Cached prices are used and the
+    rest are fetched concurrently then cached together. A price that
+    can't be fetched is None and isn't cached.
+    """
+    stocks = {url: Stock(url, cache_name, cache_hours) for url in urls}
+    result, missing = {}, []
+    for url, stock in stocks.items():
+        result[url] = stock.cached()
+        if result[url] is None:
+            missing.append(url)
+    if missing:
+        with stocks[missing[0]].locked() as cached:
+            fetch = []
+            for url in missing:
+                data = stocks[url].fresh(cached.get(url))
+                if data is None:
+                    fetch.append(url)
+                else:
+                    result[url] = data["price"]
+            for url, price in _fetcher().fetch_all(fetch).items():
+                if price is not None:
+                    cached[url] = _price_dict(url, price)
+                result[url] = price
+        for url in missing:
+            if url in cached:
+                stocks[url].remember(cached[url])
+    return result
 
 
 class Stock:
-    "Fetch a stock price from online."
+    """
+    Fetch a stock price from online.
+
+    Prices are cached for cache_hours in one JSON file shared by every URL
+    and every process: {url: {"time_utc": [...], "price": float}}. Writers
+    hold a lock file while they fetch and update it and replace the file
+    atomically, so readers never see a partial write and parallel runs
+    fetch each URL once. Prices are also kept in memory for the process.
+    """
 
     def __init__(self, url, cache_name="stock-price", cache_hours=24):
         self.url = url
         self.cache = _BASE.parent / f"{cache_name}.json"
+        self.lock = _BASE.parent / f".{cache_name}.lock"
         self.cache_hours = cache_hours
 
-    def _cached(self, data=None):
-        if isinstance(data, dict):
-            json = json_dumps(data, sort_keys=True, indent=2)
-            self.cache.write_text(f"{json}\n", encoding="utf-8")
-        if not self.cache.is_file():
-            return None, None
-        raw = json_loads(self.cache.read_text("utf-8"))
-        if raw["url"] != self.url:
-            return None, None
-        time_utc = datetime(*raw["time_utc"], tzinfo=timezone.utc)
+    def fresh(self, data):
+        "Returns data if it's a price dict for url within cache_hours"
+        if not isinstance(data, dict) or data.get("url") != self.url:
+            return None
+        time_utc = datetime(*data["time_utc"], tzinfo=timezone.utc)
         cache_limit = time_utc + timedelta(hours=self.cache_hours)
         if datetime.now(timezone.utc) > cache_limit:
-            return None, None
-        return time_utc, raw["price"]
+            return None
+        return data
+
+    def _read(self):
+        "Returns the cache file as a dict of url to price dict"
+        try:
+            raw = json_loads(self.cache.read_text("utf-8"))
+        except (OSError, JSONDecodeError):
+            return {}
+        if "url" in raw:  # Single price from before the multi-URL cache
+            return {raw["url"]: raw}
+        return {url: dict(data, url=url) for url, data in raw.items()}
+
+    def _write(self, entries):
+        "Replaces the cache file with entries, a dict of url to price dict"
+        raw = {}
+        for url, data in entries.items():
+            raw[url] = {"time_utc": data["time_utc"], "price": data["price"]}
+        json = json_dumps(raw, sort_keys=True, indent=2)
+        with NamedTemporaryFile(
+            "w", dir=self.cache.parent, suffix=".tmp", delete=False
+        ) as file:
+            file.write(f"{json}\n")
+        replace(file.name, self.cache)
+
+    @contextmanager
+    def locked(self):
+        """
+        Holds the exclusive cache lock, yielding the cache's dict of url to
+        price dict. Changes to the dict are written back on exit.
+        """
+        with open(self.lock, "a", encoding="utf-8") as file:
+            flock(file, LOCK_EX)  # Released when the file closes
+            entries = self._read()
+            before = dict(entries)
+            yield entries
+            if entries != before:
+                self._write(entries)
+
+    def remember(self, data):
+        "Keeps price dict data in memory for this process"
+        _MEMO[(self.cache, self.url)] = data
+
+    def _cached(self):
+        "Returns the cached price dict or None, from memory then the file"
+        key = (self.cache, self.url)
+        data = self.fresh(_MEMO.get(key))
+        if data is not None:
+            count("stock cache memory hit")
+            return data
+        data = self.fresh(self._read().get(self.url))
+        if data is not None:
+            count("stock cache file hit")
+            self.remember(data)
+        return data
+
+    def cached(self):
+        "Returns the cached float price or None, never fetches"
+        data = self._cached()
+        return None if data is None else data["price"]
 
     def price_dict(self):
         "Return a price dict"
-        time_utc, price = self._cached()
-        update_cache = False
-        if not isinstance(price, float):
-            time_utc = datetime.now(timezone.utc)
-            update_cache = True
-            parser = _Parser()
-            with request.urlopen(self.url) as url:
-                parser.feed(url.read().decode("utf-8"))
-                price = parser.last_price()
-            if price is None:
-                error(f"can't get stock '{self.url}'")
-
-        data = {
-            "time_utc": [
-                time_utc.year,
-                time_utc.month,
-                time_utc.day,
-                time_utc.hour,
-                time_utc.minute,
-                time_utc.second,
-            ],
-            "url": self.url,
-            "price": price,
-        }
-        if update_cache:
-            self._cached(data)
+        data = self._cached()
+        if data is not None:
+            return data
+        with self.locked() as cached:
+            # Another process may have fetched while we waited.
+            data = self.fresh(cached.get(self.url))
+            if data is None:
+                data = _price_dict(self.url, _fetcher().fetch(self.url))
+                cached[self.url] = data
+        self.remember(data)
         return data
 
     def price(self):
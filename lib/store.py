@@ -0,0 +1,215 @@
+"Out-of-core result store for per-paycheck ledgers"
+
+from datetime import datetime
+from json import dumps as json_dumps
+from json import loads as json_loads
+from pathlib import Path
+from struct import Struct
+
+from income import Income
+from log import error
+from optional import optional
+
+# File layout, all little endian:
+#   header   magic, version, row count, index offset, index length
+#   rows     fixed-width records, see dtype(), scenario after scenario
+#   index    JSON: fields, kinds and one [name, params, start, count] per
+#            scenario in the order written
+_MAGIC = b"PAYSTORE"
+_VERSION = 1
+_HEADER = Struct("<8sIQQQ")
+
+
+def dtype():
+    """
+    Returns the record dtype for one paycheck: every Income field in CSV
+    column order, the pay date as datetime64[D], the kind as a uint16 code
+    into the store's kinds and everything else float64.
+    """
+    fields = []
+    for attr in Income.__slots__:
+        if attr == "date":
+            fields.append((attr, "<M8[D]"))
+        elif attr == "kind":
+            fields.append((attr, "<u2"))
+        else:
+            fields.append((attr, "<f8"))
+    return optional("numpy").dtype(fields)
+
+
+def records(income_list):
+    """
+    Returns (rows, kinds) for a list of Income objects: rows is an array of
+    store records with kind codes into the kinds list. The pair is what
+    worker processes send back to the process writing the store.
+    """
+    rows = optional("numpy").zeros(len(income_list), dtype=dtype())
+    kinds = []
+    for attr in Income.__slots__:
+        values = [getattr(income, attr) for income in income_list]
+        if attr == "date":
+            values = [value.date() for value in values]
+        elif attr == "kind":
+            for value in values:
+                if value not in kinds:
+                    kinds.append(value)
+            values = [kinds.index(value) for value in values]
+        rows[attr] = values
+    return rows, kinds
+
+
+class StoreWriter:
+    """
+    Writes scenario ledgers to path one scenario at a time. Rows go straight
+    to the file, only the small scenario index is kept in memory until
+    close(). Use as a context manager.
+    """
+
+    def __init__(self, path):
+        if optional("numpy") is None:
+            error("result store requires numpy")
+        self.path = Path(path)
+        self.dtype = dtype()
+        self.kinds, self.scenarios, self.rows = [], [], 0
+        # pylint: disable=consider-using-with
+        self.file = open(self.path, "wb")
+        self.file.write(_HEADER.pack(_MAGIC, _VERSION, 0, 0, 0))
+
+    def _kind(self, kind):
+        if kind not in self.kinds:
+            self.kinds.append(kind)
+        return self.kinds.index(kind)
+
+    def add(self, name, income_list, params=None):
+        """
+        Appends one scenario, a list of Income objects in pay order. params
+        is any JSON data kept in the index.
+        """
+        self.add_records(name, *records(income_list), params)
+
+    def add_records(self, name, rows, kinds, params=None):
+        "Appends one scenario from a records() (rows, kinds) pair"
+        if len(rows):
+            codes = optional("numpy").array(
+                [self._kind(kind) for kind in kinds], "<u2"
+            )
+            rows = rows.copy()
+            rows["kind"] = codes[rows["kind"]]
+        self.file.write(rows.astype(self.dtype, copy=False).tobytes())
+        self.scenarios.append([name, params, self.rows, len(rows)])
+        self.rows += len(rows)
+
+    def close(self):
+        "Writes the index and header, the store is readable afterwards"
+        if self.file.closed:
+            return
+        index = {
+            "fields": list(Income.__slots__),
+            "kinds": self.kinds,
+            "scenarios": self.scenarios,
+        }
+        raw = json_dumps(index).encode("utf-8")
+        offset = self.file.tell()
+        self.file.write(raw)
+        self.file.seek(0)
+        self.file.write(
+            _HEADER.pack(_MAGIC, _VERSION, self.rows, offset, len(raw))
+        )
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Store:
+    """
+    Reads a store written by StoreWriter. Records are memory-mapped, every
+    slice below is a view into the file and nothing is parsed or copied
+    until it's used.
+    """
+
+    def __init__(self, path):
+        np = optional("numpy")
+        if np is None:
+            error("result store requires numpy")
+        self.path = Path(path)
+        with open(self.path, "rb") as file:
+            raw = file.read(_HEADER.size)
+            if len(raw) != _HEADER.size:
+                error(f"truncated result store '{path}'")
+            magic, version, rows, offset, length = _HEADER.unpack(raw)
+            if magic != _MAGIC or version != _VERSION:
+                error(f"not a version {_VERSION} result store '{path}'")
+            file.seek(offset)
+            index = json_loads(file.read(length).decode("utf-8"))
+        if index["fields"] != list(Income.__slots__):
+            error(f"result store '{path}' has different Income fields")
+        self.kinds = index["kinds"]
+        self.names = [name for name, _, _, _ in index["scenarios"]]
+        self.lookup = {name: at for at, name in enumerate(self.names)}
+        self.params = [params for _, params, _, _ in index["scenarios"]]
+        self.bounds = [
+            (start, start + count) for _, _, start, count in index["scenarios"]
+        ]
+        self.records = np.zeros(0, dtype=dtype())
+        if rows:
+            self.records = np.memmap(
+                self.path,
+                dtype=dtype(),
+                mode="r",
+                offset=_HEADER.size,
+                shape=(rows,),
+            )
+
+    def __len__(self):
+        return len(self.names)
+
+    def _index(self, scenario):
+        if isinstance(scenario, str):
+            if scenario not in self.lookup:
+                error(f"no scenario '{scenario}' in result store")
+            return self.lookup[scenario]
+        if not -len(self) <= scenario < len(self):
+            error(f"no scenario {scenario} in result store")
+        return scenario % len(self)
+
+    def scenario(self, scenario):
+        "Returns the records of a scenario, by index or name"
+        start, end = self.bounds[self._index(scenario)]
+        return self.records[start:end]
+
+    def field(self, attr, scenario=None):
+        "Returns one field for a scenario, or for every row when None"
+        if attr not in self.records.dtype.names:
+            error(f"no result store field '{attr}'")
+        rows = self.records if scenario is None else self.scenario(scenario)
+        return rows[attr]
+
+    def dates(self, scenario, start=None, end=None):
+        """
+        Returns a scenario's records paid from start up to and including
+        end, dates are datetime or datetime64 and None means unbounded.
+        """
+        np = optional("numpy")
+        rows = self.scenario(scenario)
+        dates = rows["date"]
+        low, high = 0, len(rows)
+        if start is not None:
+            start = np.datetime64(_day(start), "D")
+            low = int(np.searchsorted(dates, start, side="left"))
+        if end is not None:
+            end = np.datetime64(_day(end), "D")
+            high = int(np.searchsorted(dates, end, side="right"))
+        return rows[low:high]
+
+    def kind(self, code):
+        "Returns the kind string for a kind code"
+        return self.kinds[code]
+
+
+def _day(value):
+    "Returns a date for a datetime, or value unchanged"
+    return value.date() if isinstance(value, datetime) else value
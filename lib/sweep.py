@@ -0,0 +1,110 @@
+"Scenario sweeps over config parameter grids"
+
+from ast import literal_eval
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from math import floor
+
+# pylint takes config for the repo's config/ directory, not lib/config.py.
+# pylint: disable=wrong-import-order
+from config import load
+from log import ErrorExit, error, verbose_level
+from pay import Pay, totals
+from store import records
+
+# pylint: enable=wrong-import-order
+
+# The config class of a worker, loaded once per process by _init().
+_CONFIG = {}
+
+
+def values(spec):
+    """
+    Returns the list of values for a grid axis spec. Either comma separated
+    Python literals, "0,2.5,5", or an inclusive range start:stop:step,
+    "0:6:1" (step defaults to 1).
+    """
+    if ":" in spec:
+        parts = [float(part) for part in spec.split(":")]
+        if len(parts) == 2:
+            parts.append(1.0)
+        if len(parts) != 3 or parts[2] <= 0.0 or parts[1] < parts[0]:
+            error(f"invalid range '{spec}'")
+        start, stop, step = parts
+        count = floor((stop - start) / step + 1e-9) + 1
+        return [round(start + index * step, 9) for index in range(count)]
+    result = []
+    for part in spec.split(","):
+        try:
+            result.append(literal_eval(part.strip()))
+        except (SyntaxError, ValueError):
+            result.append(part.strip())
+    return result
+
+
+def grid(axes):
+    """
+    Returns (paths, points) for axes, a list of "dotted.path=spec" strings.
+    points is every combination of the axis values in row-major order.
+    """
+    paths, lists = [], []
+    for axis in axes:
+        path, sep, spec = axis.partition("=")
+        if not sep or not path or not spec:
+            error(f"invalid grid axis '{axis}', use path=values")
+        if path in paths:
+            error(f"duplicate grid axis '{path}'")
+        paths.append(path)
+        lists.append(values(spec))
+    return paths, list(product(*lists))
+
+
+def _init(filename, log_level, ledger):
+    verbose_level(log_level)
+    _CONFIG["filename"] = filename
+    _CONFIG["class"] = load(filename)
+    _CONFIG["log_level"] = log_level
+    _CONFIG["ledger"] = ledger
+
+
+def evaluate(paths, point):
+    """
+    Worker: returns (point, totals, message, ledger) for one grid point.
+    totals is None and message the reason when the point doesn't estimate.
+    ledger is the store.records() pair of every income when the sweep
+    keeps ledgers, otherwise None.
+    """
+    overrides = dict(zip(paths, point))
+    try:
+        cfg = _CONFIG["class"](_CONFIG["filename"], overrides)
+        cfg.save.warm_start = False  # Points must not share a state file
+        pay = Pay(cfg, _CONFIG["log_level"], engine="fused")
+        ledger = records(pay.income) if _CONFIG["ledger"] else None
+        return point, totals(pay.income), "", ledger
+    except ErrorExit as exc:
+        return point, None, exc.msg, None
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        return point, None, f"{type(exc).__name__}: {exc}", None
+
+
+def sweep(filename, paths, points, jobs=1, log_level=0, ledger=False):
+    """
+    Estimates filename's Config at every grid point, yielding evaluate()
+    results in the order of points. The config file is loaded once per
+    process, each point only instantiates the Config class with its
+    overrides, see Config.override().
+    """
+    _init(filename, log_level, ledger)
+    if jobs == 1 or len(points) < 2:
+        for point in points:
+            yield evaluate(paths, point)
+        return
+    chunksize = max(len(points) // (jobs * 4), 1)
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init,
+        initargs=(filename, log_level, ledger),
+    ) as pool:
+        yield from pool.map(
+            evaluate, [paths] * len(points), points, chunksize=chunksize
+        )
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"Monte Carlo estimate of stock driven income."
+
+from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
+from signal import signal, SIGPIPE, SIG_DFL
+from sys import exit as sys_exit
+
+from lib.config import config_path, load
+from lib.log import warn
+from lib.montecarlo import MODELS, MonteCarlo, history
+
+
+def main():
+    "The main routine."
+    parser = ArgumentParser(
+        description="A Monte Carlo paystub calculator for RSU and ESPP prices",
+        formatter_class=ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        default=0,
+        action="count",
+        help="verbosity level, repeat to increase",
+    )
+    parser.add_argument(
+        "-n", "--paths", default=10_000, type=int, help="price paths"
+    )
+    parser.add_argument(
+        "-m", "--model", default="gbm", choices=MODELS, help="price model"
+    )
+    parser.add_argument(
+        "--mu", default=0.0, type=float, help="gbm yearly drift"
+    )
+    parser.add_argument(
+        "--sigma", default=0.3, type=float, help="gbm yearly volatility"
+    )
+    parser.add_argument(
+        "--history",
+        default=None,
+        help="bootstrap price history file, last field is the close",
+    )
+    parser.add_argument(
+        "-p",
+        "--price",
+        default=None,
+        type=float,
+        help="starting price, default rsu_price or today's price",
+    )
+    parser.add_argument(
+        "-s", "--seed", default=None, type=int, help="random seed"
+    )
+    parser.add_argument(
+        "config_dir",
+        metavar="CONFIG_DIR",
+        nargs=1,
+        help="directory containing config.py",
+    )
+    args = parser.parse_args()
+    args.config = config_path(args.config_dir[0])
+    if not args.config.is_file():
+        parser.error(f"can't find config '{args.config}'")
+    if args.model == "bootstrap" and args.history is None:
+        parser.error("bootstrap model requires --history")
+
+    returns = history(args.history) if args.history else None
+    simulation = MonteCarlo(
+        load(args.config)(args.config), args.price, args.verbose
+    )
+    totals = simulation.simulate(
+        args.paths, args.model, args.mu, args.sigma, returns, args.seed
+    )
+    print("\n".join(simulation.table(totals)))
+
+
+if __name__ == "__main__":
+    signal(SIGPIPE, SIG_DFL)  # Suppress broken pipe exceptions.
+    try:
+        main()
+        sys_exit(0)
+    except KeyboardInterrupt:
+        warn("received keyboard interrupt (CTRL-C), aborting")
+        sys_exit(1)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"Project one config across several years."
+
+from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
+from os import cpu_count
+from pathlib import Path
+from signal import signal, SIGPIPE, SIG_DFL
+from sys import exit as sys_exit
+
+from lib.config import config_path, parse_today
+from lib.income import quote
+from lib.log import warn
+from lib.output import FORMATS, suffix
+from lib.pay import TOTALS
+from lib.project import project
+
+
+def main():
+    "The main routine."
+    parser = ArgumentParser(
+        description="A multi-year paystub projection",
+        formatter_class=ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        default=0,
+        action="count",
+        help="verbosity level, repeat to increase",
+    )
+    parser.add_argument(
+        "-y", "--years", default=5, type=int, help="years to project"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        default=cpu_count(),
+        type=int,
+        help="number of worker processes",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        default=None,
+        help="also write each year's report to this directory",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        default="csv",
+        choices=FORMATS,
+        help="report format",
+    )
+    parser.add_argument(
+        "--no-cache",
+        default=False,
+        action="store_true",
+        help="always estimate, don't use or update the result cache",
+    )
+    parser.add_argument(
+        "--today",
+        default=None,
+        help="estimate as if today is YYYY-MM-DD",
+    )
+    parser.add_argument(
+        "config_dir",
+        metavar="CONFIG_DIR",
+        nargs=1,
+        help="directory containing config.py",
+    )
+    args = parser.parse_args()
+    args.config = config_path(args.config_dir[0])
+    if not args.config.is_file():
+        parser.error(f"can't find config '{args.config}'")
+    if args.years < 1:
+        parser.error(f"invalid years {args.years}")
+    if args.jobs < 1:
+        parser.error(f"invalid jobs {args.jobs}")
+
+    output = None
+    if args.output_dir is not None:
+        output = Path(args.output_dir)
+        output.mkdir(parents=True, exist_ok=True)
+    options = {
+        "log_level": args.verbose,
+        "today": None if args.today is None else parse_today(args.today),
+        "cache": not args.no_cache,
+        "output": output,
+        "format": args.format,
+        "suffix": suffix(args.format),
+    }
+    failed = 0
+    print(",".join(["Year"] + [title for _, title in TOTALS] + ["Error"]))
+    for year, totals, message, _ in project(
+        args.config, args.years, args.jobs, options
+    ):
+        fields = [str(year)]
+        if totals is None:
+            failed += 1
+            fields += [""] * len(TOTALS)
+        else:
+            fields += [f"{total:.4f}" for total in totals]
+        print(",".join(fields + [quote(message)]))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    signal(SIGPIPE, SIG_DFL)  # Suppress broken pipe exceptions.
+    try:
+        sys_exit(main())
+    except KeyboardInterrupt:
+        warn("received keyboard interrupt (CTRL-C), aborting")
+        sys_exit(1)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"Serve stand-in stock quote pages for offline runs."
+
+from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
+from signal import signal, SIGPIPE, SIG_DFL
+from sys import exit as sys_exit
+
+from lib.log import info, verbose_level, warn
+from lib.quoteserver import QuoteServer
+
+
+def main():
+    "The main routine."
+    parser = ArgumentParser(
+        description="A stand-in stock quote server",
+        formatter_class=ArgumentDefaultsHelpFormatter,
+        epilog=(
+            "example: quoteserver -p 8000 ABC=85.5 XYZ=20 then set a "
+            "config's rsu_url to http://127.0.0.1:8000/ABC"
+        ),
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        default=0,
+        action="count",
+        help="verbosity level, repeat to increase",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="listen address")
+    parser.add_argument(
+        "-p", "--port", default=8000, type=int, help="listen port"
+    )
+    parser.add_argument(
+        "--price",
+        default=100.0,
+        type=float,
+        help="price for tickers not given",
+    )
+    parser.add_argument(
+        "--delay",
+        default=0.0,
+        type=float,
+        help="seconds before every response",
+    )
+    parser.add_argument(
+        "--fail",
+        default=0,
+        type=int,
+        help="503 responses for each path before its page",
+    )
+    parser.add_argument(
+        "--padding",
+        default=0,
+        type=int,
+        help="bytes of filler after the price",
+    )
+    parser.add_argument(
+        "tickers",
+        metavar="TICKER=PRICE",
+        nargs="*",
+        help="ticker prices served at /TICKER",
+    )
+    args = parser.parse_args()
+    verbose_level(args.verbose)
+    prices = {}
+    for ticker in args.tickers:
+        name, sep, price = ticker.partition("=")
+        try:
+            prices[name] = float(price)
+        except ValueError:
+            sep = ""
+        if not sep or not name:
+            parser.error(f"invalid ticker '{ticker}', use TICKER=PRICE")
+
+    server = QuoteServer(
+        args.host,
+        args.port,
+        prices,
+        args.price,
+        args.delay,
+        args.fail,
+        args.padding,
+    )
+    info(f"serving {server.url('TICKER')}", level=0)
+    with server:
+        server.serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    signal(SIGPIPE, SIG_DFL)  # Suppress broken pipe exceptions.
+    try:
+        sys_exit(main())
+    except KeyboardInterrupt:
+        warn("received keyboard interrupt (CTRL-C), aborting")
+        sys_exit(1)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"Estimate one config across a grid of parameter values."
+
+from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
+from os import cpu_count
+from signal import signal, SIGPIPE, SIG_DFL
+from sys import exit as sys_exit
+
+from lib.config import config_path
+from lib.income import quote
+from lib.log import warn
+from lib.store import StoreWriter
+from lib.pay import TOTALS
+from lib.sweep import grid, sweep
+
+
+def main():
+    "The main routine."
+    parser = ArgumentParser(
+        description="A paystub calculator parameter sweep",
+        formatter_class=ArgumentDefaultsHelpFormatter,
+        epilog=(
+            "example: sweep -g pay.increase.percent=0:6 "
+            "-g rsu_price=60:120:20 -g pay.espp.percent_second=0,5,10,15 "
+            "config"
+        ),
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        default=0,
+        action="count",
+        help="verbosity level, repeat to increase",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        default=cpu_count(),
+        type=int,
+        help="number of worker processes",
+    )
+    parser.add_argument(
+        "-g",
+        "--grid",
+        metavar="PATH=VALUES",
+        action="append",
+        required=True,
+        help=(
+            "dotted config path and its values, a comma separated list or "
+            "an inclusive start:stop[:step] range, repeat for more axes"
+        ),
+    )
+    parser.add_argument(
+        "-s",
+        "--store",
+        default=None,
+        help="also write every point's ledger to this result store file",
+    )
+    parser.add_argument(
+        "config_dir",
+        metavar="CONFIG_DIR",
+        nargs=1,
+        help="directory containing config.py",
+    )
+    args = parser.parse_args()
+    args.config = config_path(args.config_dir[0])
+    if not args.config.is_file():
+        parser.error(f"can't find config '{args.config}'")
+    if args.jobs < 1:
+        parser.error(f"invalid jobs {args.jobs}")
+
+    paths, points = grid(args.grid)
+    store = None if args.store is None else StoreWriter(args.store)
+    failed = 0
+    print(",".join(paths + [title for _, title in TOTALS] + ["Error"]))
+    results = sweep(
+        args.config, paths, points, args.jobs, args.verbose, store is not None
+    )
+    for point, totals, message, ledger in results:
+        fields = [quote(str(value)) for value in point]
+        if totals is None:
+            failed += 1
+            fields += [""] * len(TOTALS)
+        else:
+            fields += [f"{total:.4f}" for total in totals]
+        print(",".join(fields + [quote(message)]))
+        if store is not None and ledger is not None:
+            name = ",".join(f"{p}={v}" for p, v in zip(paths, point))
+            store.add_records(name, *ledger, dict(zip(paths, point)))
+    if store is not None:
+        store.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    signal(SIGPIPE, SIG_DFL)  # Suppress broken pipe exceptions.
+    try:
+        sys_exit(main())
+    except KeyboardInterrupt:
+        warn("received keyboard interrupt (CTRL-C), aborting")
+        sys_exit(1)